@@ -1,146 +1,466 @@
 # script for prototyping on the picow using circuitpython
 # this script reads wifi credentials from the settings.toml file,
 # connects to the wifi net, sets the hostname, and using an NTP server to set device time
-# http requests (200) are used to trigger the reading of sensor data and responding with the data
+# the sensor is sampled on a schedule and requests are answered with the latest reading
 from microcontroller import watchdog as wdt
 from watchdog import WatchDogMode
-import microcontroller
+import wifi
 import board
-import rtc
 import time
-import os
-import sys
-import adafruit_logging as logging
+import cPyLog
+import cPyConfig
 import cPyNetConf
 import smSensor
-import json
-from collections import OrderedDict
+import smCalibration
+import smFormat
+import smSchedule
+import smStore
+import smHistory
+import smReading
+import cPyAnnounce
+import cPyCoalesce
+import cPyTasks
+import smStats
+import cPyMemory
+import cPyPower
+import cPyMetrics
+import cPyHttp
+import cPyUpload
+import gc
+import adafruit_connection_manager
+from adafruit_wsgi.wsgi_app import WSGIApp
 
 # Function to format the time in a customized format
 def format_time(t):
-    return f"{{t.tm_mon:02d}/t.tm_mday:02d}/{t.tm_year} {t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
+    return f"{t.tm_mon:02d}/{t.tm_mday:02d}/{t.tm_year} {t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
 
 # Function to get the current timestamp
 def get_timestamp():
     now = time.localtime()
-    return f"{{now.tm_mon:02d}/now.tm_mday:02d}/{now.tm_year} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}"
+    return f"{now.tm_mon:02d}/{now.tm_mday:02d}/{now.tm_year} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}"
 
-last_print_time = time.monotonic()
-
-def debug_print(msg):
-    global last_print_time
-    return
-    if time.monotonic() - last_print_time > 10:  # Limit to once every 10 sec
-        print(msg)
-        last_print_time = time.monotonic()  # Store logs in memory (can print later)
-
-
-# Globals for filtering and sensor
-UNITTEST = True
+# Calibration table from path (a CalibrationTable.save() file, or "voltage,percent" lines for .csv),
+# None when there is no path or the file is missing so the caller falls back to the linear table
+def load_calibration(path):
+    if not path:
+        return None
+    try:
+        if path.endswith(".csv"):
+            return smCalibration.CalibrationTable.load_csv(path)
+        return smCalibration.CalibrationTable.load(path)
+    except OSError as e:
+        print(f"Calibration {path} not loaded ({e}), using the linear table")
+        return None
 
 # Main function is where the work is performed
 def main():
     # Connect to Wi-Fi
     print(f"Soil Sensor Initializing...")
-    # Redirects output to avoid crashing Thonny
-    # Enable Watchdog Timer
+    # Typed settings from settings.toml, live ones can be changed with "CONFIG <token> KEY=value ..."
+    config = cPyConfig.Config().load()
+    # Records go to an in-memory ring fetched with LOGS, not to the serial port (which can crash Thonny)
+    logger = cPyLog.RingLog(level=cPyLog.LEVELS[config.log_level])
+    # Enable Watchdog Timer, fed by the scheduler only while every task is making progress
     wdt.timeout = 8  # Set the watchdog timeout to 8 seconds (maximum supported)
     wdt.mode = WatchDogMode.RESET
+    # Heap watermarks, garbage is collected only when the scheduler is idle
+    memory = cPyMemory.MemoryMonitor()
+    # Light sleep (alarm TimeAlarm) whenever nothing is due, active/idle time is profiled per cycle
+    sleeper = cPyPower.make_sleeper() if config.light_sleep else None
+    scheduler = cPyTasks.Scheduler(wdt, idle=memory.idle, log=logger, sleeper=sleeper)
+    fault = scheduler.last_fault()
+    if fault:
+        print(f"Reset after task {fault[0]} {fault[1]}")
+        logger.warning("reset after task %s %s", fault[0], fault[1])
     
-    logger = logging.getLogger('debug')
-    
-    # Load settings from settings.toml and check for no credentials
-    WIFI_SSID = os.getenv("WIFI_SSID")
-    WIFI_PASSWORD = os.getenv("WIFI_PASS")
-    HOSTNAME = os.getenv("HOSTNAME")
-    BCAST_IP = "10.0.0.255"
-    NETPORT = 5244
-    MAX_RETRIES = 10
+    NETPORT = config.netport
     #instantiate cPyNetConf class as netConf
-    netConf = cPyNetConf.cPyNetConfig(WIFI_SSID, WIFI_PASSWORD, NETPORT, BCAST_IP)
+    netConf = cPyNetConf.cPyNetConfig(config.wifi_ssid, config.wifi_pass, NETPORT, config.announce_group, config.hostname)
 
     # instatiate smSensor class as sensor
     # Initialize the soil moisture sensor on the appropriate analog pin
     moisture_pin = board.A0
     threshold_pin = board.GP1
-    sensor = smSensor.SoilMoistureSensor(moisture_pin, threshold_pin)
+    # Per-stage latency histograms, STATS_ENABLED = 0 in settings.toml turns them off completely
+    stats = smStats.LatencyStats(enabled=config.stats_enabled)
+    # Multi-point calibration from SM_CALIBRATION, otherwise the linear table over SM_MIN/MAX_VOLTAGE
+    calibration = load_calibration(config.sm_calibration)
+    calibrated = calibration is not None
+    if not calibrated:
+        calibration = smCalibration.CalibrationTable.linear(config.sm_min_voltage, config.sm_max_voltage)
+    sensor = smSensor.SoilMoistureSensor(moisture_pin, threshold_pin, config.sm_min_voltage, config.sm_max_voltage,
+                                         calibration=calibration, threshold_events=True, stats=stats,
+                                         alpha=config.sm_alpha, stable_tolerance=config.sm_stable_tolerance)
     
     #setup some timers
-    last_ntp_update = time.monotonic()
-    ntp_interval = 60
-    last_update = time.monotonic()
-    update_interval = 10  # Time interval in seconds
+    ntp_interval = 3600  # resync the RTC hourly
+    # The sensor is read only by sample_task, so the filter and the diagnostics see the same cadence
+    # however often collectors poll
+    update_interval = config.sm_update_interval  # Time interval in seconds
+    # Sample down to SM_MIN_INTERVAL (2 seconds) apart while the soil is changing, backing off to
+    # SM_UPDATE_INTERVAL when it is quiet
+    sampler = smSchedule.AdaptiveInterval(min_interval=config.sm_min_interval, max_interval=update_interval)
+    # Readings are logged to flash independently of requests and replayed on "/backlog"
+    reading_log = smStore.ReadingLog("/log")
+    log_interval = config.sm_log_interval
     now = time.localtime()
-    #debug_print(f"Initial UTC Time: {format_time(now)}")
+    logger.debug("initial time %s", format_time(now))
 
 
-    # configure wifi and network 
-    netConf.connect_to_wifi()
+    # configure wifi and network, retries yield to the scheduler so the watchdog keeps being fed
+    scheduler.run_steps(netConf.connect_steps())
     mySock, myServer = netConf.config_net()
     if not mySock:
         print("Network setup failed. Exiting...")
         exit()
     else:
         print(f"sock setup complete: {mySock}, {myServer}")
+    # never block, the tasks below poll the socket between their other work
+    mySock.settimeout(0)
     # initial ntp time source and set rtc
-    netConf.init_ntp()
+    scheduler.run_steps(netConf.ntp_steps())
     
     # initialize variables
-    announcement = b"ITAOT"
-    announce_recv = False
+    announcement = netConf.announcement()  # ITAOT plus capabilities, one packet registers the node
+    # every 5 seconds until a collector ACKs, then backing off up to every 10 minutes
+    announcer = cPyAnnounce.Announcer(mySock, announcement, netConf.BROADCAST_IP, NETPORT)
 
-    print(f"Broadcasting {announcement.decode()} to {BCAST_IP}:{NETPORT} every 5 seconds")
+    print(f"Announcing {announcement.decode()} to {netConf.BROADCAST_IP}:{NETPORT}")
     buffer = bytearray(1024)  # Create a buffer for incoming data
-    while True:
-        if not announce_recv:
+    # One preallocated payload per supported format, rendered at most once per reading
+    formatters = {
+        "text": smFormat.ReadingFormatter(smFormat.HEALTH_UDP_TEMPLATE),
+        "json": smFormat.ReadingFormatter(smFormat.HEALTH_JSON_TEMPLATE, size=176),
+    }
+    lengths = {"text": 0, "json": 0}  # 0 = not rendered for the current reading
+    reading = smReading.Reading()  # latest sample, shared by the log, the requests and the metrics
+    have_reading = False
+    fresh = False  # sampled since it was last served, needs a sequence number and a new render
+    unlogged = False  # sampled since it was last logged
+    event_buffer = bytearray(256)
+    event_length = 0
+    # Data requests arriving within 200ms share one reading
+    coalescer = cPyCoalesce.RequestCoalescer(window=0.2)
+    # Recently sent readings, resent when a collector NACKs a sequence range
+    history = smHistory.ReadingHistory(64)
+    logged = 0
+
+    # Prometheus exposition at http://HOSTNAME.local/metrics, laid out once, numbers patched per scrape
+    page = cPyMetrics.MetricsPage()
+    m_voltage = page.add("soil_voltage_volts", "gauge", "Filtered probe voltage", places=4)
+    m_moisture = page.add("soil_moisture_percent", "gauge", "Soil moisture", places=2)
+    m_threshold = page.add("soil_threshold", "gauge", "Threshold input state")
+    m_health = page.add("soil_sensor_health_flags", "gauge", "Probe health flag bits, 0 = healthy")
+    m_flagged = page.add("soil_sensor_flagged_total", "counter", "Samples that raised a health flag")
+    m_logged = page.add("soil_readings_logged_total", "counter", "Readings written to the flash log")
+    m_served = page.add("soil_readings_served_total", "counter", "Sequence numbered readings sent to collectors")
+    m_backlog = page.add("soil_log_backlog", "gauge", "Logged readings not yet replayed")
+    m_latency = [[page.add("soil_stage_latency_us", "gauge", "Stage latency percentiles in microseconds",
+                           f'stage="{name}",quantile="{q}"') for q in ("0.5", "0.95", "0.99")]
+                 for name in smStats.STAGES]
+    m_spans = [page.add("soil_stage_spans_total", "counter", "Timed stage spans", f'stage="{name}"')
+               for name in smStats.STAGES]
+    m_heap_free = page.add("soil_heap_free_bytes", "gauge", "Free heap")
+    m_heap_min = page.add("soil_heap_min_free_bytes", "gauge", "Lowest free heap seen")
+    m_gc_runs = page.add("soil_gc_collections_total", "counter", "Scheduled garbage collections")
+    m_gc_max = page.add("soil_gc_max_us", "gauge", "Longest scheduled garbage collection")
+    m_rssi = page.add("soil_wifi_rssi_dbm", "gauge", "Wi-Fi signal strength")
+    m_reconnects = page.add("soil_wifi_reconnects_total", "counter", "Wi-Fi reconnections since boot")
+    m_overruns = page.add("soil_task_overruns_total", "counter", "Scheduler task steps over budget")
+    m_uptime = page.add("soil_uptime_seconds", "gauge", "Seconds since boot")
+    m_active = page.add("soil_active_seconds_total", "counter", "Time spent running tasks", places=2)
+    m_idle = page.add("soil_idle_seconds_total", "counter", "Time spent sleeping between tasks", places=2)
+    m_duty = page.add("soil_duty_cycle_ratio", "gauge", "Active fraction of the time", places=4, width=6)
+    m_upload_backlog = page.add("soil_upload_backlog", "gauge", "Logged readings not yet uploaded")
+    m_uploaded = page.add("soil_readings_uploaded_total", "counter", "Readings accepted by the cloud")
+    m_upload_posts = page.add("soil_upload_requests_total", "counter", "Cloud upload requests")
+    m_upload_failures = page.add("soil_upload_failures_total", "counter", "Failed cloud uploads")
+    page.build()
+    metrics_headers = [("Content-Type", cPyMetrics.CONTENT_TYPE), ("Content-Length", str(page.length))]
+    boot_time = time.monotonic()
+
+    def update_metrics():
+        if have_reading:
+            page.set(m_voltage, reading.voltage)
+            page.set(m_moisture, reading.moisture)
+            page.set(m_threshold, 1 if reading.threshold else 0)
+            page.set(m_health, reading.health)
+        if sensor.diagnostics is not None:
+            page.set(m_flagged, sensor.diagnostics.flagged)
+        page.set(m_logged, logged)
+        page.set(m_served, history.next_seq)
+        page.set(m_backlog, reading_log.backlog())
+        if stats.enabled:
+            for stage in range(len(smStats.STAGES)):
+                count, p50, p95, p99, top = stats.summary(stage)
+                page.set(m_latency[stage][0], p50)
+                page.set(m_latency[stage][1], p95)
+                page.set(m_latency[stage][2], p99)
+                page.set(m_spans[stage], count)
+        page.set(m_heap_free, gc.mem_free())
+        page.set(m_heap_min, memory.min_free)
+        page.set(m_gc_runs, memory.collections)
+        page.set(m_gc_max, memory.gc_max_us)
+        ap_info = wifi.radio.ap_info
+        page.set(m_rssi, ap_info.rssi if ap_info is not None else 0)
+        page.set(m_reconnects, max(0, netConf.connects - 1))
+        overruns = 0
+        for task in scheduler.tasks:
+            overruns += task.overruns
+        page.set(m_overruns, overruns)
+        page.set(m_uptime, int(time.monotonic() - boot_time))
+        page.set(m_active, scheduler.duty.active)
+        page.set(m_idle, scheduler.duty.idle)
+        page.set(m_duty, scheduler.duty.ratio())
+        if uploader is not None:
+            page.set(m_upload_backlog, uploader.backlog())
+            page.set(m_uploaded, uploader.uploaded)
+            page.set(m_upload_posts, uploader.posts)
+            page.set(m_upload_failures, uploader.failures)
+
+    web_app = WSGIApp()
+
+    @web_app.route("/metrics")
+    def metrics(request):
+        update_metrics()
+        return ("200 OK", metrics_headers, [page.payload()])
+
+    # One socket pool for the radio, shared with the upload session
+    pool = adafruit_connection_manager.get_radio_socketpool(wifi.radio)
+    http = cPyHttp.WSGIServer(pool, web_app, port=config.metrics_port, memory=memory)
+    http.start()
+
+    # Logged readings go to the cloud in bulk writes (a few requests per hour) over one kept-alive
+    # connection, from their own log cursor so "/backlog" replays still see everything
+    uploader = None
+    if config.blynk_auth_token:
+        uploader = cPyUpload.BatchUploader(cPyUpload.make_session(wifi.radio), reading_log, config.blynk_auth_token,
+                                           url=config.upload_url, batch=config.upload_batch,
+                                           interval=config.upload_interval)
+
+    # The reading keeps the raw sample in volts, the JSON reply has always carried the ADC counts
+    def raw_counts(r):
+        return int(r.volts * 65535 / 3.3 + 0.5)
+
+    def resend(old, addr, fmt):
+        formatter = formatters[fmt]
+        length = formatter.render_reading(old, raw_counts(old))
+        mySock.sendto(formatter.payload(length), addr)
+        lengths[fmt] = 0  # buffer reused, render the current reading again when next asked
+
+    def serve():
+        nonlocal fresh, event_length
+        memory.begin_request()
+        # Requests share the latest sample, it gets its sequence number when it is first served
+        if fresh:
+            history.add(reading)
+            fresh = False
+            lengths["text"] = lengths["json"] = 0
+            # Threshold crossings since the last reading go to everyone served with it
+            event_length = 0
+            if sensor.threshold_events_pending():
+                event_length = sensor.threshold.render(event_buffer)
+        for addr, fmt in coalescer.drain():
+            formatter = formatters[fmt]
+            if not lengths[fmt]:
+                start = stats.start()
+                lengths[fmt] = formatter.render_reading(reading, raw_counts(reading))
+                stats.stop(smStats.STAGE_FORMAT, start)
+                if logger.enabled(cPyLog.DEBUG):
+                    logger.debug("%s", bytes(formatter.payload(lengths[fmt])).decode())
+            start = stats.start()
+            mySock.sendto(formatter.payload(lengths[fmt]), addr)
+            stats.stop(smStats.STAGE_SENDTO, start)
+            if event_length:
+                mySock.sendto(memoryview(event_buffer)[:event_length], addr)
+        memory.end_request()
+
+    # "/backlog" replay, one chunk per scheduler step so a long backlog cannot starve the watchdog
+    replay_chunk = bytearray(b"LOG ") + bytearray(32 * smStore.RECORD_SIZE)
+
+    def backlog_steps(addr):
+        view = memoryview(replay_chunk)
+        sent = 0
+        busy = 0
+        while True:
+            length = reading_log.peek(view[4:])
+            if not length:
+                break
             try:
-                mySock.sendto(announcement, (BCAST_IP, NETPORT))
-                logger.debug(f"{announcement.decode()} broadcasted")
+                mySock.sendto(view[:4 + length], addr)
             except OSError as e:
-                if e.errno == 11:  # EAGAIN
-                    logger.debug("Send buffer full, retrying...")
-                    time.sleep(0.1)  # Small delay before retrying
-                else:
-                    raise  # Raise other unexpected errors
-            
-        try:
-            logger.info(f"checking for response:")
-            data, addr = mySock.recvfrom_into(buffer)  # 1024 is the buffer size
-            received_msg = data.decode()
-            annouce_recv = True
-
-            #debug_print(f"Received response from {addr}: {received_msg}")
-
-            #debug_print(f"{received_msg} received")
-            if "ACK" in received_msg:
+                if e.errno not in (11, 116):
+                    raise
+                # Socket buffer full, try the same chunk again shortly; give up after 2 seconds
+                busy += 1
+                if busy > 40:
+                    break
+                yield 0.05
+                continue
+            busy = 0
+            reading_log.advance(length, save=False)
+            sent += length // smStore.RECORD_SIZE
+            yield 0
+        if sent:
+            reading_log.advance(0)  # checkpoint once per replay
+        mySock.sendto(f"LOGEND {sent}".encode(), addr)
+
+    # Scheduler tasks, each yield hands control back with the seconds until the task wants to run again
+    def sample_task():
+        nonlocal have_reading, fresh, unlogged, update_interval
+        while True:
+            sensor.read(reading)
+            have_reading = fresh = unlogged = True
+            update_interval = sampler.update(reading.voltage, reading.stable, time.monotonic())
+            yield update_interval
+
+    # At most one log entry per SM_LOG_INTERVAL, and none while no new sample was taken
+    def log_task():
+        nonlocal logged, unlogged
+        while True:
+            if unlogged:
+                reading_log.append_reading(reading)
+                unlogged = False
+                logged += 1
+            yield log_interval
+
+    def http_task():
+        while True:
+            yield 0 if http.poll() else 0.1
+
+    def net_task():
+        while True:
+            memory.sample()
+            current_time = time.monotonic()
+            if have_reading and coalescer.ready(current_time):
+                serve()
+            try:
+                nbytes, addr = mySock.recvfrom_into(buffer)  # 1024 is the buffer size
+            except OSError as e:
+                if e.errno in (11, 116):  # EAGAIN / ETIMEDOUT, nothing waiting
+                    yield 0.05
+                    continue
+                raise
+            request_start = stats.start()
+            memory.begin_request()
+            received_msg = buffer[:nbytes].decode()
+
+            if logger.enabled(cPyLog.DEBUG):
+                logger.debug("received %s from %s", config.redact(received_msg), addr[0])
+            if "NACK" not in received_msg and "ACK" in received_msg:
+                announcer.acknowledge()
                 mySock.sendto(f"{get_timestamp()} WAY?".encode(), addr)
+            elif received_msg.startswith("WHO"):
+                # A collector is looking for nodes, answer now and announce at the fast rate again
+                mySock.sendto(announcement, addr)
+                announcer.reset(current_time)
             elif "WAY" in received_msg:
                 mySock.sendto(f"{get_timestamp()} IAM: {netConf.HOSTNAME} {netConf.device_version}, {netConf.device_capabilities}".encode(), addr)
             elif "/current_data" in received_msg:
-                # Check if the sensor update interval has elapsed
-                current_time = time.monotonic()
-                if current_time - last_update >= update_interval:
-                    # Read sensor data and apply filtering
-                    #raw_value = read_seesaw_soil_moisture()
-                    timestamp = get_timestamp()
-                    voltage, moisture = sensor.read_moisture_percentage()
-                    threshold_state = sensor.read_threshold()
-                    stable = sensor.voltage_stable(voltage)
-                    stability_marker = '*' if stable else '+'
-                    formatted_output = f"[{timestamp}] Voltage: {voltage:.3f}V, Moisture: {moisture:.1f}%, Threshold: {threshold_state} {stability_marker}"
-                    mySock.sendto(f"{formatted_output}".encode(), addr)
-                    if UNITTEST:
-                     logger.info(formatted_output)
-
-                    last_update = current_time
-            continue
-        except KeyboardInterrupt:
-            #debug_print("\nShutting down server...")
-            mySock.close()
-        except Exception as e:
-            logger.info(f"No response yet: {e}")
-       
-        time.sleep(5)
+                # Answered from the shared reading once the coalescing window closes
+                coalescer.add(addr, cPyCoalesce.RequestCoalescer.parse_format(received_msg), time.monotonic())
+            elif received_msg.startswith("NACK"):
+                # Gap fill, e.g. "NACK 12-15,18 fmt=json"; ranges no longer held are reported as GONE
+                fmt = cPyCoalesce.RequestCoalescer.parse_format(received_msg)
+                missing = history.resend(smHistory.parse_nack(received_msg), lambda old: resend(old, addr, fmt))
+                for first, last in missing:
+                    mySock.sendto(f"GONE {first}-{last}".encode(), addr)
+            elif "/backlog" in received_msg:
+                # Forward everything logged since the last replay, packed smStore records
+                yield from backlog_steps(addr)
+            elif received_msg.startswith("STATS"):
+                # p50/p95/p99 per stage and heap/GC counters, "STATS RESET" clears the histograms
+                report = f"{stats.report()}\n{memory.report()}\n{scheduler.duty.report()}"
+                if uploader is not None:
+                    report += f"\n{uploader.report()}"
+                mySock.sendto(report.encode(), addr)
+                if "RESET" in received_msg:
+                    stats.reset()
+            elif received_msg.startswith("CONFIG"):
+                # "CONFIG <token>" lists the live settings, "CONFIG <token> SM_ALPHA=0.2 ..." applies them
+                reply = config.handle_command(received_msg)
+                logger.info("config from %s: %s", addr[0], reply)
+                mySock.sendto(reply.encode(), addr)
+            elif received_msg.startswith("LOGS"):
+                # "LOGS <token>" returns the ring log records, several datagrams when they do not fit one;
+                # "LOGS <token> CLEAR" empties the ring. Same token as CONFIG, disabled without one
+                parts = received_msg.split()
+                if len(parts) < 2 or not config.authorized(parts[1]):
+                    mySock.sendto(b"LOGS DENIED", addr)
+                else:
+                    held = logger.count()
+                    start = 0
+                    while start < held:
+                        length, start = logger.render(buffer, start)
+                        if not length:
+                            break
+                        mySock.sendto(memoryview(buffer)[:length], addr)
+                    mySock.sendto(f"LOGSEND {held}".encode(), addr)
+                    if "CLEAR" in parts[2:]:
+                        logger.clear()
+            stats.stop(smStats.STAGE_REQUEST, request_start)
+            memory.end_request()
+            yield 0
+
+    def announce_task():
+        while True:
+            current_time = time.monotonic()
+            announcer.check_link(wifi.radio.ipv4_address, current_time)
+            if announcer.poll(current_time):
+                logger.debug("announcement %d sent", announcer.sent)
+            yield min(1, max(0, announcer.next_time - time.monotonic()))
+
+    def wifi_task():
+        while True:
+            if not wifi.radio.connected:
+                yield from netConf.connect_steps()
+            yield 5
+
+    def ntp_task():
+        while True:
+            yield ntp_interval
+            yield from netConf.ntp_steps()
+
+    # Live CONFIG updates, validated as a whole by config before they get here
+    def apply_config(changed):
+        nonlocal log_interval, update_interval
+        sensor.alpha = config.sm_alpha
+        sensor.min_voltage = config.sm_min_voltage
+        sensor.max_voltage = config.sm_max_voltage
+        if not calibrated:
+            sensor.calibration = smCalibration.CalibrationTable.linear(config.sm_min_voltage, config.sm_max_voltage)
+        sensor.stable_tolerance = config.sm_stable_tolerance
+        sampler.min_interval = config.sm_min_interval
+        sampler.max_interval = config.sm_update_interval
+        update_interval = min(max(update_interval, sampler.min_interval), sampler.max_interval)
+        log_interval = config.sm_log_interval
+        logger.set_level(config.log_level)
+        if uploader is not None:
+            uploader.interval = config.upload_interval
+        if "ANNOUNCE_GROUP" in changed:
+            netConf.BROADCAST_IP = config.announce_group
+            announcer.target = (config.announce_group, NETPORT)
+            announcer.reset(time.monotonic())
+
+    config.on_change(apply_config)
+
+    # budget = longest single step, deadline = longest time a task may go without progress
+    scheduler.add("sample", sample_task, budget=0.5, deadline=30)
+    scheduler.add("log", log_task, budget=1, deadline=30)
+    scheduler.add("net", net_task, budget=2, deadline=30)
+    scheduler.add("announce", announce_task, budget=0.5, deadline=30)
+    scheduler.add("http", http_task, budget=http.timeout + 1, deadline=30)
+    # The blocking network steps keep their name in nvm, a watchdog reset during one is reported at boot
+    scheduler.add("wifi", wifi_task, budget=netConf.CONNECT_TIMEOUT + 1, deadline=120, record=True)
+    scheduler.add("ntp", ntp_task, budget=netConf.NTP_TIMEOUT + 1, deadline=60, record=True)
+    if uploader is not None:
+        # One HTTP request per step, well inside the 8 second watchdog
+        scheduler.add("upload", uploader.steps, budget=uploader.timeout + 1, deadline=60, record=True)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        logger.info("shutting down server")
+        mySock.close()
 
 # Run the main function
 if __name__ == "__main__":
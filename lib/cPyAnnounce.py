@@ -0,0 +1,59 @@
+### Pico W (Server) - CircuitPython ###
+# Announcement scheduler, broadcasts (or multicasts) the node announcement
+# quickly until a collector acknowledges it, then backs off exponentially.
+# A link change or a collector's WHO query brings the fast rate back
+import time
+
+class Announcer:
+    def __init__(self, sock, announcement, group, port, min_interval=5, max_interval=600, backoff=2):
+        self.sock = sock
+        self.announcement = announcement
+        self.target = (group, port)  # broadcast address or multicast group
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.next_time = time.monotonic()  # announce right away
+        self.acked = False
+        self.link = None
+        self.offline = False  # check_link() saw no address, nothing is sent until one is back
+        self.sent = 0
+
+    # True when the next announcement is due
+    def due(self, now):
+        return now >= self.next_time
+
+    # Send the announcement if due, back off once a collector has acknowledged us
+    def poll(self, now):
+        if self.offline or not self.due(now):
+            return False
+        try:
+            self.sock.sendto(self.announcement, self.target)
+        except OSError as e:
+            if e.errno == 11:  # EAGAIN, send buffer full, try again shortly
+                self.next_time = now + 0.1
+                return False
+            raise  # Raise other unexpected errors
+        self.sent += 1
+        if self.acked:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        self.next_time = now + self.interval
+        return True
+
+    # A collector acknowledged the announcement
+    def acknowledge(self):
+        self.acked = True
+
+    # Start over at the fast rate, e.g. after a WHO query or a link change
+    def reset(self, now):
+        self.acked = False
+        self.interval = self.min_interval
+        self.next_time = now
+
+    # Re-announce promptly when the link (e.g. our IP address) changes, None = no link
+    def check_link(self, link, now):
+        self.offline = link is None
+        if link != self.link:
+            if self.link is not None:
+                self.reset(now)
+            self.link = link
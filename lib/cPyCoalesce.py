@@ -0,0 +1,44 @@
+### Pico W (Server) - CircuitPython ###
+# Request coalescing, data requests arriving within a short window are
+# answered together from one reading and one payload per requested format
+
+class RequestCoalescer:
+    def __init__(self, window=0.2, max_clients=8):
+        self.window = window
+        self.max_clients = max_clients
+        self.clients = []  # (addr, format) waiting for the next reading
+        self.first = None  # monotonic time of the oldest waiting request
+        self.coalesced = 0  # requests that shared a reading with an earlier one
+
+    # Requested payload format, e.g. "/current_data?fmt=json"
+    @staticmethod
+    def parse_format(msg):
+        if "fmt=json" in msg:
+            return "json"
+        return "text"
+
+    # Queue a requester, repeated requests from the same client and format are merged
+    def add(self, addr, fmt, now):
+        for client in self.clients:
+            if client[0] == addr and client[1] == fmt:
+                return False
+        if len(self.clients) >= self.max_clients:
+            return False
+        if self.first is None:
+            self.first = now
+        else:
+            self.coalesced += 1
+        self.clients.append((addr, fmt))
+        return True
+
+    # True once the oldest waiting request has waited for the whole window, or the batch is full
+    # (answered before the next request is received, so later pollers start the next batch)
+    def ready(self, now):
+        return self.first is not None and (now - self.first >= self.window or len(self.clients) >= self.max_clients)
+
+    # Hand back the waiting requesters and start a new window
+    def drain(self):
+        clients = self.clients
+        self.clients = []
+        self.first = None
+        return clients
@@ -0,0 +1,194 @@
+### Pico W (Server) - CircuitPython ###
+# Typed node configuration, loaded once from settings.toml and tunable at run
+# time with an authenticated CONFIG command. Every update is parsed and
+# validated as a whole before anything changes, then applied in one go and
+# handed to the registered listeners (sensor, sampler, network stack)
+import os
+
+_BOOL_TRUE = ("1", "true", "yes", "on")
+_BOOL_FALSE = ("0", "false", "no", "off")
+
+# Dotted IPv4 address check, raises ValueError
+def ipv4(text):
+    parts = text.split(".")
+    if len(parts) != 4:
+        raise ValueError
+    for part in parts:
+        if not part.isdigit() or int(part) > 255:
+            raise ValueError
+
+class Setting:
+    def __init__(self, key, kind, default, low=None, high=None, live=False, secret=False, choices=None, check=None):
+        self.key = key  # settings.toml name
+        self.attr = key.lower()  # attribute on the Config object
+        self.kind = kind  # str, int, float or bool
+        self.default = default
+        self.low = low
+        self.high = high
+        self.live = live  # may be changed with CONFIG, otherwise needs a restart
+        self.secret = secret  # never reported back
+        self.choices = choices  # upper case, values are matched regardless of case
+        self.check = check  # check(value) raises ValueError for a malformed value
+
+    # Convert a settings.toml value (str or int) or a CONFIG string to the setting's type
+    def parse(self, raw):
+        try:
+            if self.kind is bool:
+                text = str(raw).lower()
+                if text in _BOOL_TRUE:
+                    return True
+                if text in _BOOL_FALSE:
+                    return False
+                raise ValueError
+            value = self.kind(raw) if self.kind is str else self.kind(str(raw))
+        except ValueError:
+            raise ValueError(f"{self.key}: expected {self.kind.__name__}, got {raw}")
+        if self.check is not None:
+            try:
+                self.check(value)
+            except ValueError:
+                raise ValueError(f"{self.key}: malformed value {raw}")
+        if self.choices is not None:
+            value = value.upper()
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"{self.key}: expected one of {','.join(self.choices)}")
+        if self.low is not None and value < self.low:
+            raise ValueError(f"{self.key}: below {self.low}")
+        if self.high is not None and value > self.high:
+            raise ValueError(f"{self.key}: above {self.high}")
+        return value
+
+SETTINGS = (
+    Setting("WIFI_SSID", str, None),
+    Setting("WIFI_PASS", str, None, secret=True),
+    Setting("HOSTNAME", str, "soilsensor"),
+    Setting("ANNOUNCE_GROUP", str, "10.0.0.255", live=True, check=ipv4),
+    Setting("NETPORT", int, 5244, 1, 65535),
+    Setting("METRICS_PORT", int, 80, 1, 65535),
+    Setting("CONFIG_TOKEN", str, None, secret=True),
+    Setting("LOG_LEVEL", str, "INFO", live=True, choices=("DEBUG", "INFO", "WARNING", "ERROR")),
+    Setting("STATS_ENABLED", bool, True),
+    Setting("LIGHT_SLEEP", bool, True),  # alarm light sleep between scheduled work
+    # Sensor and sampling
+    Setting("SM_ALPHA", float, 0.3, 0.01, 1.0, live=True),
+    Setting("SM_MIN_VOLTAGE", float, 3.0, 0.0, 3.3, live=True),  # dry
+    Setting("SM_MAX_VOLTAGE", float, 1.8, 0.0, 3.3, live=True),  # wet
+    Setting("SM_STABLE_TOLERANCE", float, 0.005, 0.0, 1.0, live=True),
+    Setting("SM_MIN_INTERVAL", float, 2.0, 0.1, 3600.0, live=True),
+    Setting("SM_UPDATE_INTERVAL", float, 10.0, 0.1, 3600.0, live=True),
+    Setting("SM_LOG_INTERVAL", float, 10.0, 1.0, 86400.0, live=True),
+    Setting("SM_CALIBRATION", str, None),  # e.g. /calib.bin (CalibrationTable.save()) or /calib.csv
+    # Cloud upload of the reading log, off without a token
+    Setting("blynk_auth_token", str, None, secret=True),
+    Setting("UPLOAD_URL", str, "https://blynk.cloud/external/api/batch/update"),
+    Setting("UPLOAD_INTERVAL", float, 1800.0, 60.0, 86400.0, live=True),
+    Setting("UPLOAD_BATCH", int, 256, 1, 1024),  # readings per bulk write
+)
+
+class Config:
+    def __init__(self, settings=SETTINGS):
+        self.settings = {}
+        for setting in settings:
+            self.settings[setting.key] = setting
+            setattr(self, setting.attr, setting.default)
+        self.listeners = []
+        self.updates = 0  # CONFIG updates applied
+        self.rejected = 0  # CONFIG commands refused (bad token or invalid values)
+
+    # Read every setting from settings.toml, raises ValueError on an invalid value
+    def load(self, getenv=os.getenv):
+        values = {}
+        for key in self.settings:
+            raw = getenv(key)
+            if raw is not None:
+                values[key] = raw
+        self._set(self.validate(values, live_only=False))
+        return self
+
+    # Parse and check a {KEY: raw} update as a whole, return the typed values
+    def validate(self, values, live_only=True):
+        typed = {}
+        for key, raw in values.items():
+            setting = self.settings.get(key) or self.settings.get(key.upper())
+            if setting is None:
+                raise ValueError(f"{key}: unknown setting")
+            if live_only and not setting.live:
+                raise ValueError(f"{setting.key}: needs a restart")
+            typed[setting.key] = setting.parse(raw)
+        # Checks across settings, on the values as they would be after the update
+        min_voltage = typed.get("SM_MIN_VOLTAGE", self.sm_min_voltage)
+        max_voltage = typed.get("SM_MAX_VOLTAGE", self.sm_max_voltage)
+        if min_voltage == max_voltage:
+            raise ValueError("SM_MIN_VOLTAGE and SM_MAX_VOLTAGE must differ")
+        if typed.get("SM_MIN_INTERVAL", self.sm_min_interval) > typed.get("SM_UPDATE_INTERVAL", self.sm_update_interval):
+            raise ValueError("SM_MIN_INTERVAL must not exceed SM_UPDATE_INTERVAL")
+        return typed
+
+    def _set(self, typed):
+        for key, value in typed.items():
+            setattr(self, self.settings[key].attr, value)
+
+    # listener(changed) is called with {KEY: value} after every applied update
+    def on_change(self, listener):
+        self.listeners.append(listener)
+
+    # Validate then apply a live update, nothing changes if any value is rejected
+    def apply(self, values):
+        typed = self.validate(values)
+        self._set(typed)
+        self.updates += 1
+        for listener in self.listeners:
+            listener(typed)
+        return typed
+
+    # Compare against CONFIG_TOKEN without an early exit, CONFIG is disabled without a token
+    def authorized(self, token):
+        expected = self.config_token
+        if not expected or len(token) != len(expected):
+            return False
+        diff = 0
+        for a, b in zip(token, expected):
+            diff |= ord(a) ^ ord(b)
+        return diff == 0
+
+    # The message with the token of a "CONFIG <token> ..." or "LOGS <token> ..." command masked, for logging
+    @staticmethod
+    def redact(msg):
+        if not (msg.startswith("CONFIG") or msg.startswith("LOGS")):
+            return msg
+        parts = msg.split(" ", 2)
+        if len(parts) > 1:
+            parts[1] = "***"
+        return " ".join(parts)
+
+    # "KEY=value ..." for the live settings (or all non-secret ones)
+    def describe(self, live_only=True):
+        parts = []
+        for setting in self.settings.values():
+            if setting.secret or (live_only and not setting.live):
+                continue
+            parts.append(f"{setting.key}={getattr(self, setting.attr)}")
+        return " ".join(parts)
+
+    # "CONFIG <token> [KEY=value ...]", returns the reply text
+    # The token travels in clear text, it keeps casual LAN traffic out, not an attacker
+    def handle_command(self, msg):
+        parts = msg.split()
+        if len(parts) < 2 or not self.authorized(parts[1]):
+            self.rejected += 1
+            return "CONFIG DENIED"
+        if len(parts) == 2:
+            return f"CONFIG {self.describe()}"
+        values = {}
+        for part in parts[2:]:
+            pair = part.split("=", 1)
+            if len(pair) != 2:
+                self.rejected += 1
+                return f"CONFIG ERR {part}: expected KEY=value"
+            values[pair[0]] = pair[1]
+        try:
+            typed = self.apply(values)
+        except ValueError as e:
+            self.rejected += 1
+            return f"CONFIG ERR {e}"
+        return "CONFIG OK " + " ".join(f"{key}={value}" for key, value in typed.items())
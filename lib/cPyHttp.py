@@ -0,0 +1,119 @@
+### Pico W (Server) - CircuitPython ###
+# Minimal WSGI server on the native socketpool (esp32spi_wsgiserver needs an
+# ESP32 co-processor). The listening socket is non-blocking and poll() is
+# called from a scheduler task; each connection is one request, read into a
+# preallocated buffer, handed to the application (e.g. adafruit_wsgi WSGIApp)
+# and closed. Request bodies are not supported, which suits GET scrapes
+import io
+import time
+
+class WSGIServer:
+    def __init__(self, pool, application, port=80, timeout=1, memory=None):
+        self.pool = pool
+        self.application = application
+        self.port = port
+        self.timeout = timeout  # whole header read (and each send), keep it well inside the task budget
+        self.memory = memory  # optional cPyMemory.MemoryMonitor, brackets every request
+        self.buffer = bytearray(1024)  # request line and headers
+        self.sock = None
+        self.requests = 0
+        self.errors = 0
+        self._status = None
+        self._headers = None
+
+    # Bind and listen without blocking
+    def start(self):
+        self.sock = self.pool.socket(self.pool.AF_INET, self.pool.SOCK_STREAM)
+        self.sock.setsockopt(self.pool.SOL_SOCKET, self.pool.SO_REUSEADDR, 1)
+        self.sock.bind(("0.0.0.0", self.port))
+        self.sock.listen(2)
+        self.sock.setblocking(False)
+        print(f"HTTP server listening on port {self.port}")
+
+    def _start_response(self, status, headers):
+        self._status = status
+        self._headers = headers
+
+    # TCP send() may take only part of a large payload
+    @staticmethod
+    def _send_all(client, data):
+        view = memoryview(data)
+        sent = 0
+        while sent < len(view):
+            sent += client.send(view[sent:])
+
+    # Read up to the end of the headers, return the byte count or 0
+    # The socket timeout only bounds each recv, so a slow client is cut off at a deadline for the whole head
+    def _read_head(self, client):
+        nbytes = 0
+        deadline = time.monotonic() + self.timeout
+        while nbytes < len(self.buffer):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 0
+            client.settimeout(remaining)
+            count = client.recv_into(memoryview(self.buffer)[nbytes:])
+            if not count:
+                break
+            nbytes += count
+            if self.buffer.find(b"\r\n\r\n", 0, nbytes) >= 0:
+                return nbytes
+        return nbytes
+
+    def _environ(self, nbytes):
+        end = self.buffer.find(b"\r\n", 0, nbytes)
+        line = bytes(self.buffer[:end if end >= 0 else nbytes]).decode()
+        method, path, version = line.split(" ", 2)
+        query = ""
+        if "?" in path:
+            path, query = path.split("?", 1)
+        return {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "SERVER_PROTOCOL": version,
+            "SERVER_PORT": self.port,
+            "wsgi.input": io.BytesIO(b""),
+        }
+
+    # Serve at most one waiting connection, return True if one was handled
+    def poll(self):
+        try:
+            client, addr = self.sock.accept()
+        except OSError as e:
+            if e.errno in (11, 116):  # EAGAIN / ETIMEDOUT, nobody waiting
+                return False
+            raise
+        if self.memory is not None:
+            self.memory.begin_request()
+        try:
+            client.settimeout(self.timeout)
+            nbytes = self._read_head(client)
+            if not nbytes:
+                return True
+            client.settimeout(self.timeout)  # full timeout again for each send
+            self._status = None
+            self._headers = []
+            try:
+                result = self.application(self._environ(nbytes), self._start_response)
+            except ValueError:
+                result = []
+                self._status = "400 Bad Request"
+            status = self._status or "404 Not Found"
+            head = f"HTTP/1.1 {status}\r\n"
+            for name, value in self._headers:
+                head += f"{name}: {value}\r\n"
+            self._send_all(client, f"{head}Connection: close\r\n\r\n".encode())
+            for data in result:
+                if isinstance(data, str):
+                    data = data.encode()
+                self._send_all(client, data)
+            self.requests += 1
+        except OSError as e:
+            self.errors += 1
+            print(f"HTTP request from {addr[0]} failed: {e}")
+        finally:
+            client.close()
+            if self.memory is not None:
+                self.memory.end_request()
+        return True
@@ -0,0 +1,114 @@
+### Pico W (Server) - CircuitPython ###
+# Level-gated logging into an in-memory ring of fixed size entries.
+# Messages are %-style templates with up to three arguments, formatting
+# happens only after a record passes the level check, so a disabled debug()
+# call costs one comparison and allocates nothing. Records are fetched on
+# demand (the LOGS command) instead of being printed to the slow serial port
+import struct
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+_LEVEL_NAMES = {DEBUG: "D", INFO: "I", WARNING: "W", ERROR: "E"}
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+
+# Entry header: monotonic ms, level, text length
+_HEADER = "<IBB"
+_HEADER_SIZE = struct.calcsize(_HEADER)
+_UNSET = object()  # placeholder for arguments that were not passed
+
+class RingLog:
+    def __init__(self, entries=64, entry_size=64, level=INFO, echo=False):
+        self.entries = entries
+        self.entry_size = entry_size  # header plus text, longer messages are truncated
+        self.buffer = bytearray(entries * entry_size)
+        self.level = level
+        self.echo = echo  # also print records, for bench debugging over serial
+        self.next = 0  # total records written, the ring slot is next % entries
+        self.dropped = 0  # records below the level, counted but never formatted
+
+    # Level name (e.g. "DEBUG") or number
+    def set_level(self, level):
+        if isinstance(level, str):
+            level = LEVELS[level.upper()]
+        self.level = level
+
+    # Cheap guard for callers that have to do work to build the arguments
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, msg, a=_UNSET, b=_UNSET, c=_UNSET):
+        if level < self.level:
+            self.dropped += 1
+            return
+        if a is not _UNSET:
+            if b is _UNSET:
+                msg = msg % (a,)
+            elif c is _UNSET:
+                msg = msg % (a, b)
+            else:
+                msg = msg % (a, b, c)
+        if self.echo:
+            print(msg)
+        text = msg.encode()
+        length = min(len(text), self.entry_size - _HEADER_SIZE)
+        offset = (self.next % self.entries) * self.entry_size
+        struct.pack_into(_HEADER, self.buffer, offset, int(time.monotonic() * 1000) & 0xFFFFFFFF, level, length)
+        offset += _HEADER_SIZE
+        for i in range(length):
+            self.buffer[offset + i] = text[i]
+        self.next += 1
+
+    def debug(self, msg, a=_UNSET, b=_UNSET, c=_UNSET):
+        if DEBUG >= self.level:
+            self.log(DEBUG, msg, a, b, c)
+        else:
+            self.dropped += 1
+
+    def info(self, msg, a=_UNSET, b=_UNSET, c=_UNSET):
+        self.log(INFO, msg, a, b, c)
+
+    def warning(self, msg, a=_UNSET, b=_UNSET, c=_UNSET):
+        self.log(WARNING, msg, a, b, c)
+
+    def error(self, msg, a=_UNSET, b=_UNSET, c=_UNSET):
+        self.log(ERROR, msg, a, b, c)
+
+    # Number of records still held
+    def count(self):
+        return min(self.next, self.entries)
+
+    # Render held records oldest first as "12.345 I message" lines into buf,
+    # starting at the start-th held record; returns (length, next start) so
+    # a large ring can be sent in several datagrams
+    def render(self, buf, start=0):
+        held = self.count()
+        first = self.next - held
+        pos = 0
+        while start < held:
+            offset = ((first + start) % self.entries) * self.entry_size
+            ms, level, length = struct.unpack_from(_HEADER, self.buffer, offset)
+            line = f"{ms // 1000}.{ms % 1000:03d} {_LEVEL_NAMES.get(level, '?')} ".encode()
+            if pos + len(line) + length + 1 > len(buf):
+                if pos == 0:
+                    length = max(0, len(buf) - len(line) - 1)  # lone record bigger than buf, truncate it
+                else:
+                    break
+            if pos + len(line) + 1 > len(buf):
+                break
+            buf[pos:pos + len(line)] = line
+            pos += len(line)
+            offset += _HEADER_SIZE
+            for i in range(length):
+                buf[pos + i] = self.buffer[offset + i]
+            pos += length
+            buf[pos] = 10  # newline
+            pos += 1
+            start += 1
+        return pos, start
+
+    # Forget every record
+    def clear(self):
+        self.next = 0
@@ -0,0 +1,90 @@
+### Pico W (Server) - CircuitPython ###
+# Heap and GC telemetry. Records free/alloc watermarks per loop iteration and
+# per request, and runs gc.collect() only from idle points in the schedule
+# (once enough has been allocated, or free heap runs low) while timing every
+# collection. The automatic collector stays enabled as a backstop
+import gc
+import time
+
+try:
+    gc.mem_free
+    _mem_free = gc.mem_free
+    _mem_alloc = gc.mem_alloc
+except AttributeError:
+    # host, no heap counters
+    def _mem_free():
+        return 0
+
+    def _mem_alloc():
+        return 0
+
+class MemoryMonitor:
+    def __init__(self, collect_after=16384, low_free=24576):
+        self.collect_after = collect_after  # bytes allocated since the last collection before an idle collect
+        self.low_free = low_free  # collect at the next idle point when free heap drops below this
+        self.after_collect = _mem_alloc()  # alloc right after our last collection
+        self.min_free = _mem_free()  # lowest free heap seen at any sample
+        self.peak_alloc = self.after_collect  # highest alloc seen at any sample
+        self.iterations = 0
+        # per request
+        self.requests = 0
+        self.request_alloc = 0  # alloc when the current request started
+        self.request_max = 0  # most bytes allocated by a single request
+        self.request_total = 0
+        # collections
+        self.collections = 0
+        self.gc_total_us = 0
+        self.gc_max_us = 0
+
+    # Per loop iteration watermarks
+    def sample(self):
+        free = _mem_free()
+        alloc = _mem_alloc()
+        self.iterations += 1
+        if free < self.min_free:
+            self.min_free = free
+        if alloc > self.peak_alloc:
+            self.peak_alloc = alloc
+
+    # Bracket a request to record how much it allocated
+    def begin_request(self):
+        self.request_alloc = _mem_alloc()
+
+    def end_request(self):
+        alloc = _mem_alloc()
+        used = alloc - self.request_alloc
+        if used < 0:
+            used = 0  # the automatic collector ran during the request
+        self.requests += 1
+        self.request_total += used
+        if used > self.request_max:
+            self.request_max = used
+        if alloc > self.peak_alloc:
+            self.peak_alloc = alloc
+
+    # Collect now and time it
+    def collect(self):
+        start = time.monotonic_ns()
+        gc.collect()
+        elapsed = (time.monotonic_ns() - start) // 1000
+        self.collections += 1
+        self.gc_total_us += elapsed
+        if elapsed > self.gc_max_us:
+            self.gc_max_us = elapsed
+        self.after_collect = _mem_alloc()
+        return elapsed
+
+    # Call from an idle point, collects only when the policy says so
+    def idle(self, wait=0):
+        if _mem_alloc() - self.after_collect >= self.collect_after or _mem_free() < self.low_free:
+            self.collect()
+            return True
+        return False
+
+    # Counters for the stats interface
+    def report(self):
+        gc_mean = self.gc_total_us // self.collections if self.collections else 0
+        req_mean = self.request_total // self.requests if self.requests else 0
+        return (f"heap free={_mem_free()} alloc={_mem_alloc()} min_free={self.min_free} peak_alloc={self.peak_alloc}\n"
+                f"requests n={self.requests} alloc_mean={req_mean}B alloc_max={self.request_max}B\n"
+                f"gc n={self.collections} mean={gc_mean}us max={self.gc_max_us}us")
@@ -0,0 +1,91 @@
+### Pico W (Server) - CircuitPython ###
+# Prometheus text exposition rendered once into a reusable buffer. Every
+# series gets a fixed width, zero padded value field, so a scrape only
+# patches digits in place and hands out the same buffer (and length)
+import smFormat
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class MetricsPage:
+    def __init__(self, width=12):
+        self.width = width  # default digits per value, e.g. 12 holds counters up to 999999999999
+        self.families = []  # [name, type, help, [[labels, width, places], ...]]
+        self.slots = []  # (offset, width, scale, places) per series, filled by build()
+        self.buffer = None
+        self.length = 0
+        self._series = []  # (family, series) per slot, in add() order
+        self._scratch = bytearray(24)
+
+    # Register a series (same name, different labels joins the family), returns its slot
+    def add(self, name, kind, help_text, labels="", places=0, width=None):
+        if self.buffer is not None:
+            raise ValueError("Metrics page already built")
+        for family in self.families:
+            if family[0] == name:
+                break
+        else:
+            family = [name, kind, help_text, []]
+            self.families.append(family)
+        family[3].append([labels, width or self.width, places])
+        self._series.append((family, len(family[3]) - 1))
+        return len(self._series) - 1
+
+    # Lay out the page with every value zeroed
+    def build(self):
+        parts = []
+        offsets = {}
+        size = 0
+        for name, kind, help_text, series in self.families:
+            head = f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n".encode()
+            parts.append(head)
+            size += len(head)
+            for index, (labels, width, places) in enumerate(series):
+                line = f"{name}{{{labels}}} ".encode() if labels else f"{name} ".encode()
+                parts.append(line)
+                size += len(line)
+                offsets[(name, index)] = size
+                value = b"0" * (width - places - 1) + b"." + b"0" * places if places else b"0" * width
+                parts.append(value + b"\n")
+                size += len(value) + 1
+        self.buffer = bytearray(size)
+        pos = 0
+        for part in parts:
+            self.buffer[pos:pos + len(part)] = part
+            pos += len(part)
+        self.length = size
+        for family, index in self._series:
+            labels, width, places = family[3][index]
+            self.slots.append((offsets[(family[0], index)], width, 10 ** places, places))
+
+    # Patch one value in place, values that do not fit the field are clamped to all nines
+    def set(self, slot, value):
+        offset, width, scale, places = self.slots[slot]
+        buf = self.buffer
+        negative = value < 0
+        if negative:
+            value = -value
+        if places:
+            end = smFormat.write_fixed(self._scratch, 0, value, places, scale)
+        else:
+            end = smFormat.write_uint(self._scratch, 0, int(value))
+        start = 1 if negative else 0
+        if end + start > width:
+            for i in range(width):
+                buf[offset + i] = 57  # '9'
+            if places:
+                buf[offset + width - places - 1] = 46  # '.'
+            if negative:
+                buf[offset] = 45  # '-'
+            return
+        if negative:
+            buf[offset] = 45  # '-'
+        pad = width - end - start
+        for i in range(pad):
+            buf[offset + start + i] = 48  # '0'
+        pos = offset + start + pad
+        for i in range(end):
+            buf[pos + i] = self._scratch[i]
+
+    # The page as a memoryview over the reusable buffer
+    def payload(self):
+        return memoryview(self.buffer)[:self.length]
@@ -11,19 +11,45 @@ import board
 import digitalio
 
 class cPyNetConfig:
-    def __init__(self, WIFI_SSID, WIFI_PASSWORD, NETPORT, BROADCAST_IP):
+    def __init__(self, WIFI_SSID, WIFI_PASSWORD, NETPORT, BROADCAST_IP, HOSTNAME=None):
         # Initialize, connect, provision the network
-        self.WIFI_SSID = os.getenv("WIFI_SSID")
-        self.WIFI_PASSWORD = os.getenv("WIFI_PASS")
-        self.HOSTNAME = os.getenv("HOSTNAME")
-        self.BROADCAST_IP = "10.0.0.255"
-        self.NETPORT = 5244
+        self.WIFI_SSID = WIFI_SSID
+        self.WIFI_PASSWORD = WIFI_PASSWORD
+        self.HOSTNAME = HOSTNAME or os.getenv("HOSTNAME")
+        # Announcement target, a broadcast address or a multicast group (e.g. 239.255.52.44)
+        self.BROADCAST_IP = BROADCAST_IP or "10.0.0.255"
+        self.NETPORT = NETPORT
         self.MAX_RETRIES = 10
+        self.CONNECT_TIMEOUT = 4  # seconds per attempt, well inside the watchdog timeout
+        self.NTP_TIMEOUT = 3  # the DNS lookup before the query is not bounded, leave it room
+        self.ntp = None
+        self.connects = 0  # successful Wi-Fi connections, reconnects = connects - 1
         self.activity = digitalio.DigitalInOut(board.LED)
         self.activity.direction = digitalio.Direction.OUTPUT
         # Sensor specific initializations
         self.device_version = "SMS v0.1"
         self.device_capabilities = "soil moisture"
+        # Discovery, announcement and mDNS TXT records carry everything a collector needs
+        self.PROTOCOL_VERSION = 2  # 2: readings carry health flags (" H<flags>", "sm_health")
+        self.formats = ("text", "seq", "json", "log")
+        self.SERVICE_TYPE = "_cpysensor"
+
+    # Compact key=value fields describing this node, shared by the
+    # announcement datagram and the mDNS TXT records
+    def capability_fields(self):
+        return [
+            f"h={self.HOSTNAME}",
+            f"v={self.device_version}",
+            f"c={self.device_capabilities}",
+            f"p={self.PROTOCOL_VERSION}",
+            f"f={','.join(self.formats)}",
+        ]
+
+    # Single packet discovery, with the defaults:
+    # "ITAOT;h=soilsensor;v=SMS v0.1;c=soil moisture;p=2;f=text,seq,json,log"
+    # collectors that only look for ITAOT keep working
+    def announcement(self):
+        return ";".join(["ITAOT"] + self.capability_fields()).encode()
 
     def net_activity(self, count):
         while count > 0:
@@ -35,7 +61,9 @@ class cPyNetConfig:
         
     # Use a loop to attempt to connect and configure a wifi net
     # we use the settings.toml for for story credentials
-    def connect_to_wifi(self):
+    # Each attempt is bounded by CONNECT_TIMEOUT and the retry delay is yielded
+    # (seconds) instead of slept, so a scheduler can keep the watchdog fed
+    def connect_steps(self):
         if not self.WIFI_SSID or not self.WIFI_PASSWORD:
             raise ValueError("Missing required settings in settings.toml")
         attempt = 0
@@ -45,20 +73,27 @@ class cPyNetConfig:
                 print("Connecting to Wi-Fi...")
 
             try:
-                wifi.radio.connect(self.WIFI_SSID, self.WIFI_PASSWORD)
+                wifi.radio.connect(self.WIFI_SSID, self.WIFI_PASSWORD, timeout=self.CONNECT_TIMEOUT)
                 wifi.radio.hostname = self.HOSTNAME
                 print(f"Connected to Wi-Fi @ {self.WIFI_SSID}")
                 print(f"WIFI IP Address: {wifi.radio.ipv4_address}")
+                self.connects += 1
+                yield 0
                 self.net_activity(3)
-                return True  # Exit the function once connected
+                return  # Exit once connected
             except Exception as e:
                 attempt += 1
                 print(f"Failed to connect to Wi-Fi @ {self.WIFI_SSID}: {e}")
                 #print(f"Retrying ({attempt}/{self.MAX_RETRIES if self.MAX_RETRIES else '∞'}) in {delay} seconds...")
-                time.sleep(delay)  # Wait before retrying
+                yield delay  # Wait before retrying
         if UNITTEST:
             print("Max retries reached. Could not connect to Wi-Fi.")
-        return False  # Return False if connection is unsuccessful
+
+    # Blocking connect, returns True once connected
+    def connect_to_wifi(self):
+        for delay in self.connect_steps():
+            time.sleep(delay)
+        return wifi.radio.connected
 
     # Configure listening socket and mDNS,
     # this is where the HOSTNAME is set to allow for 'ping HOSTNAME.local' to work
@@ -83,31 +118,51 @@ class cPyNetConfig:
                         raise  # Unexpected error
             mdns_server = mdns.Server(wifi.radio)
             mdns_server.hostname = self.HOSTNAME
-            mdns_server.advertise_service(
-                service_type="_debug",
-                protocol="_udp",
-                port=self.NETPORT
-            )
+            try:
+                mdns_server.advertise_service(
+                    service_type=self.SERVICE_TYPE,
+                    protocol="_udp",
+                    port=self.NETPORT,
+                    txt_records=self.capability_fields()
+                )
+            except TypeError:
+                # Firmware without TXT record support, advertise the bare service
+                mdns_server.advertise_service(
+                    service_type=self.SERVICE_TYPE,
+                    protocol="_udp",
+                    port=self.NETPORT
+                )
             print(f"mDNS hostname set to {mdns_server.hostname}.local")
             return sock, mdns_server
         except Exception as e:
             print(f"Error with sock setup: {e}")
             return False
 
-    # Initialize NTP client to allow for time requests
-    def init_ntp(self):
+    # Initialize NTP client to allow for time requests, split at the
+    # socket setup and the (blocking, up to the NTP timeout) time query
+    def ntp_steps(self):
         if UNITTEST:
             print("Initializing NTP client...")
         try:
             pool = socketpool.SocketPool(wifi.radio)
-            ntp = adafruit_ntp.NTP(pool, server="pool.ntp.org", tz_offset=-7)  # Adjust tz_offset for your timezone
+            ntp = adafruit_ntp.NTP(pool, server="pool.ntp.org", tz_offset=-7, socket_timeout=self.NTP_TIMEOUT)  # Adjust tz_offset for your timezone
+        except Exception as e:
+            print(f"Failed to initialize NTP: {e}")
+            return
+        yield 0
+        try:
             rtc.set_time_source(ntp)
             now = time.localtime()
             print(f"Local Time: {now.tm_mon:02d}/{now.tm_mday:02d}/{now.tm_year} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}")
-            return ntp
+            self.ntp = ntp
         except Exception as e:
             print(f"Failed to initialize NTP: {e}")
-            return None
+
+    # Blocking NTP setup, returns the NTP client or None
+    def init_ntp(self):
+        for delay in self.ntp_steps():
+            time.sleep(delay)
+        return self.ntp
 
 
 # Globals for filtering and sensor
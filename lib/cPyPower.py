@@ -0,0 +1,86 @@
+### Pico W (Server) - CircuitPython ###
+# Duty-cycle profiling and light sleep between scheduled work. DutyCycle
+# accumulates active and idle time per cycle; LightSleep waits on an alarm
+# TimeAlarm instead of time.sleep(), and SimulatedSleep stands in for it on
+# CPython so the scheduling can be tested on a host
+import time
+
+try:
+    import alarm
+except ImportError:
+    alarm = None  # host, use SimulatedSleep
+
+class DutyCycle:
+    def __init__(self):
+        self.active = 0.0  # seconds spent working
+        self.idle = 0.0  # seconds spent sleeping
+        self.cycles = 0
+        self.last_active = 0.0  # the latest cycle
+        self.last_idle = 0.0
+        self._mark = time.monotonic()
+
+    # Close the active part of a cycle (work done since the last mark)
+    def worked(self):
+        now = time.monotonic()
+        self.last_active = now - self._mark
+        self.active += self.last_active
+        self._mark = now
+
+    # Close the idle part of a cycle (sleep since the last mark) and count the cycle
+    def slept(self):
+        now = time.monotonic()
+        self.last_idle = now - self._mark
+        self.idle += self.last_idle
+        self._mark = now
+        self.cycles += 1
+
+    # Fraction of the time spent active, 0..1
+    def ratio(self):
+        total = self.active + self.idle
+        return self.active / total if total else 0.0
+
+    def report(self):
+        return (f"duty active={self.active:.1f}s idle={self.idle:.1f}s ratio={self.ratio() * 100:.2f}% "
+                f"cycles={self.cycles}")
+
+class LightSleep:
+    def __init__(self, min_sleep=0.01):
+        self.min_sleep = min_sleep  # shorter waits just spin in time.sleep()
+        self.sleeps = 0  # light sleeps taken
+        self.slept = 0.0
+
+    # Sleep for seconds, in light sleep when it is worth setting an alarm
+    def sleep(self, seconds):
+        if seconds < self.min_sleep:
+            time.sleep(seconds)
+            return
+        wake = alarm.time.TimeAlarm(monotonic_time=time.monotonic() + seconds)
+        alarm.light_sleep_until_alarms(wake)
+        self.sleeps += 1
+        self.slept += seconds
+
+class SimulatedSleep:
+    def __init__(self, min_sleep=0.01):
+        self.min_sleep = min_sleep
+        self.sleeps = 0
+        self.slept = 0.0
+        self.alarms = []  # monotonic wake times that would have been set, newest last
+        self.max_alarms = 64
+
+    # Same decisions as LightSleep, the wait itself is a plain time.sleep()
+    def sleep(self, seconds):
+        if seconds < self.min_sleep:
+            time.sleep(seconds)
+            return
+        if len(self.alarms) == self.max_alarms:
+            self.alarms.pop(0)
+        self.alarms.append(time.monotonic() + seconds)
+        time.sleep(seconds)
+        self.sleeps += 1
+        self.slept += seconds
+
+# LightSleep on the board, SimulatedSleep anywhere without the alarm module
+def make_sleeper(min_sleep=0.01):
+    if alarm is None:
+        return SimulatedSleep(min_sleep)
+    return LightSleep(min_sleep)
@@ -0,0 +1,188 @@
+### Pico W (Server) - CircuitPython ###
+# Cooperative task scheduler that owns the watchdog. Tasks are generators, each
+# yield is a yield point and the yielded value is the number of seconds until the
+# task wants to run again. The watchdog is fed after every step while every task
+# is making progress, so each step (not a whole pass) has to fit inside the
+# watchdog timeout; a task that stalls or keeps overrunning its budget is recorded
+# by name in nvm before a controlled reset. Tasks with long blocking steps can be
+# added with record=True, their name is then kept in nvm while they step so a
+# hardware watchdog reset can still be blamed on them
+import time
+import cPyPower
+
+try:
+    import microcontroller
+except ImportError:
+    microcontroller = None  # host, faults are only printed
+
+# Fault record in nvm: magic, name length, reason code, name
+_FAULT_MAGIC = b"FLT"
+_FAULT_NAME = 24
+REASON_STALLED = 1
+REASON_OVERRUN = 2
+REASON_RUNNING = 3  # written before a recorded step and cleared after it
+_REASONS = {REASON_STALLED: "stalled", REASON_OVERRUN: "overran its budget",
+            REASON_RUNNING: "was running when the watchdog reset the board"}
+
+class Task:
+    def __init__(self, name, func, budget, deadline, record=False):
+        self.name = name
+        self.func = func  # generator function, restarted when it returns
+        self.budget = budget  # longest acceptable single step (s)
+        self.deadline = deadline  # longest acceptable time without progress (s)
+        self.record = record  # name kept in nvm while stepping, costs two flash writes per step
+        self.gen = None
+        self.next_run = time.monotonic()
+        self.late_since = None  # start of the current run of over-budget steps
+        self.runs = 0
+        self.overruns = 0
+        self.errors = 0
+        self.max_step = 0.0
+
+class Scheduler:
+    def __init__(self, watchdog=None, max_sleep=1.0, error_delay=5, idle=None, log=None, sleeper=None):
+        self.watchdog = watchdog
+        self.sleeper = sleeper  # e.g. cPyPower.LightSleep, plain time.sleep() without one
+        self.duty = cPyPower.DutyCycle()  # active versus idle time per scheduler cycle
+        self.log = log  # e.g. cPyLog.RingLog, task failures are printed without one
+        self.idle = idle  # idle(wait) is called when nothing is due, e.g. cPyMemory.MemoryMonitor.idle
+        self.max_sleep = max_sleep  # never sleep longer than this between feeds
+        self.error_delay = error_delay  # back off after a task raises
+        self.tasks = []
+        self.last_overrun = None  # (name, seconds)
+
+    # Register a task, func() must return a generator
+    # record=True is for rare, long blocking steps (Wi-Fi connect, NTP, uploads), nvm is flash
+    def add(self, name, func, budget=0.5, deadline=30, record=False):
+        task = Task(name, func, budget, deadline, record)
+        self.tasks.append(task)
+        return task
+
+    # Feed the watchdog, if there is one
+    def feed(self):
+        if self.watchdog is not None:
+            self.watchdog.feed()
+
+    @staticmethod
+    def _write_record(name, reason):
+        encoded = name.encode()[:_FAULT_NAME]
+        record = _FAULT_MAGIC + bytes((len(encoded), reason)) + encoded
+        microcontroller.nvm[0:len(record)] = record
+
+    # Write the offending task to nvm and reset the board
+    def fault(self, name, reason):
+        print(f"Task {name} {_REASONS[reason]}, resetting")
+        if microcontroller is None:
+            raise RuntimeError(f"Task {name} {_REASONS[reason]}")
+        self._write_record(name, reason)
+        microcontroller.reset()
+
+    # Return (name, reason) of the fault that caused the last reset and clear it; a running-task
+    # record only counts when the reset really came from the watchdog
+    @staticmethod
+    def last_fault():
+        if microcontroller is None or microcontroller.nvm is None:
+            return None
+        if microcontroller.nvm[0:3] != _FAULT_MAGIC:
+            return None
+        code = microcontroller.nvm[4]
+        length = microcontroller.nvm[3]
+        name = bytes(microcontroller.nvm[5:5 + length]).decode()
+        microcontroller.nvm[0:3] = b"\x00\x00\x00"
+        if code == REASON_RUNNING and microcontroller.cpu.reset_reason != microcontroller.ResetReason.WATCHDOG:
+            return None  # power cycle or reset button during the step
+        return name, _REASONS.get(code, "unknown")
+
+    # Run one step of a task and schedule it for the delay it asked for
+    def _step(self, task):
+        if task.gen is None:
+            task.gen = task.func()
+        recorded = task.record and microcontroller is not None
+        if recorded:
+            self._write_record(task.name, REASON_RUNNING)
+        start = time.monotonic()
+        try:
+            delay = next(task.gen)
+        except StopIteration:
+            task.gen = None  # finished, start over on the next run
+            delay = 0
+        except Exception as e:
+            task.gen = None
+            task.errors += 1
+            if self.log is not None:
+                self.log.error("task %s failed: %s", task.name, e)
+            else:
+                print(f"Task {task.name} failed: {e}")
+            delay = self.error_delay
+        elapsed = time.monotonic() - start
+        if recorded:
+            microcontroller.nvm[0:3] = b"\x00\x00\x00"
+        task.runs += 1
+        if elapsed > task.max_step:
+            task.max_step = elapsed
+        if elapsed > task.budget:
+            task.overruns += 1
+            self.last_overrun = (task.name, elapsed)
+            if task.late_since is None:
+                task.late_since = start
+        else:
+            task.late_since = None  # on budget, the task is making progress
+        task.next_run = time.monotonic() + (delay or 0)
+
+    # Fault the first unhealthy task, otherwise feed the watchdog; return when the next task is due
+    def _check(self):
+        now = time.monotonic()
+        next_due = now + self.max_sleep
+        for task in self.tasks:
+            if task.late_since is not None and now - task.late_since > task.deadline:
+                self.fault(task.name, REASON_OVERRUN)
+            if now - task.next_run > task.deadline:
+                self.fault(task.name, REASON_STALLED)
+            if task.next_run < next_due:
+                next_due = task.next_run
+        self.feed()
+        return next_due - now
+
+    # Run every due task once, checking health and feeding the watchdog after each step,
+    # return seconds until the next one is due
+    def run_once(self):
+        now = time.monotonic()
+        wait = None
+        for task in self.tasks:
+            if now >= task.next_run:
+                self._step(task)
+                wait = self._check()
+        if wait is None:
+            wait = self._check()  # nothing was due
+        return max(0, wait)
+
+    # Drive a single generator to completion (e.g. start-up Wi-Fi connect), feeding the watchdog between steps
+    def run_steps(self, gen):
+        for delay in gen:
+            self.feed()
+            end = time.monotonic() + (delay or 0)
+            while time.monotonic() < end:
+                time.sleep(min(self.max_sleep, end - time.monotonic()))
+                self.feed()
+        self.feed()
+
+    # Scheduler main loop, never returns
+    def run(self):
+        while True:
+            wait = self.run_once()
+            if wait > 0 and self.idle is not None:
+                start = time.monotonic()
+                self.idle(wait)
+                wait -= time.monotonic() - start  # the idle work may have used up the wait
+            self.duty.worked()
+            if wait > 0:
+                wait = min(wait, self.max_sleep)
+                if self.sleeper is not None:
+                    self.sleeper.sleep(wait)
+                else:
+                    time.sleep(wait)
+            self.duty.slept()
+
+    # Per task counters, (name, runs, overruns, errors, max step seconds)
+    def stats(self):
+        return [(t.name, t.runs, t.overruns, t.errors, t.max_step) for t in self.tasks]
@@ -0,0 +1,144 @@
+### Pico W (Server) - CircuitPython ###
+# Batched cloud upload of the flash reading log. Readings are taken from
+# their own smStore cursor (the UDP /backlog replay keeps its own), rendered
+# into one preallocated body per datastream and posted as a single bulk
+# write, by default to the Blynk timestamped batch endpoint:
+#   POST <url>?token=<token>&pin=V0   [[epoch_ms, value], ...]
+# The session is an adafruit_requests.Session on the connection manager's
+# pool, so the TLS connection is kept alive and reused between posts. The
+# cursor only moves once every datastream of a chunk was accepted; failed
+# uploads back off exponentially. Any session with post(url, data=, headers=,
+# timeout=) works, tools/upload_standin.py drives one against a local stand-in
+import sys
+import time
+import smFormat
+import smReading
+import smStore
+
+BLYNK_URL = "https://blynk.cloud/external/api/batch/update"
+# (pin, Reading attribute, decimal places) posted for every chunk
+DEFAULT_PINS = (("V0", "moisture", 2), ("V1", "voltage", 4))
+HEADERS = {"Content-Type": "application/json"}
+# adafruit_requests sends a memoryview body as is; http.client under the CPython stand-in only takes str/bytes
+_COPY_BODY = sys.implementation.name != "circuitpython"
+# Longest rendered entry: ",[" + 13 digit epoch ms + "," + value + "]"
+_ENTRY_SIZE = 32
+
+# Session on the shared radio socket pool, one per node
+def make_session(radio):
+    import adafruit_connection_manager
+    import adafruit_requests
+    pool = adafruit_connection_manager.get_radio_socketpool(radio)
+    ssl_context = adafruit_connection_manager.get_radio_ssl_context(radio)
+    return adafruit_requests.Session(pool, ssl_context)
+
+class BatchUploader:
+    def __init__(self, session, reading_log, token, url=BLYNK_URL, pins=DEFAULT_PINS, batch=256, interval=1800,
+                 min_backoff=60, max_backoff=3600, timeout=3, cursor="cloud"):
+        self.session = session
+        self.log = reading_log
+        self.pins = pins
+        self.urls = [f"{url}?token={token}&pin={pin}" for pin, attr, places in pins]
+        self.interval = interval  # seconds between uploads once the backlog is drained
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout  # per socket operation, keep it inside the task budget
+        self.cursor = cursor
+        reading_log.add_cursor(cursor)
+        self.chunk = bytearray(batch * smStore.RECORD_SIZE)
+        self.body = bytearray(batch * _ENTRY_SIZE + 2)
+        self._reading = smReading.Reading()
+        self.backoff = 0
+        self.next_time = 0  # monotonic time of the next attempt
+        self.posts = 0  # HTTP requests made
+        self.uploads = 0  # chunks accepted
+        self.uploaded = 0  # readings accepted
+        self.failures = 0
+        self.last_status = 0
+
+    # Render the chunk as [[epoch_ms,value],...] for one Reading attribute, return the length
+    def render(self, nbytes, attr, places):
+        body = self.body
+        scale = 10 ** places
+        reading = self._reading
+        pos = 1
+        body[0] = 91  # '['
+        for offset in range(0, nbytes, smStore.RECORD_SIZE):
+            smStore.load_reading(self.chunk, offset, reading)
+            if pos > 1:
+                body[pos] = 44  # ','
+                pos += 1
+            body[pos] = 91
+            pos = smFormat.write_uint(body, pos + 1, reading.timestamp)
+            pos = smFormat.write_bytes(body, pos, b"000,")  # seconds to milliseconds
+            pos = smFormat.write_fixed(body, pos, getattr(reading, attr), places, scale)
+            body[pos] = 93  # ']'
+            pos += 1
+        body[pos] = 93
+        return pos + 1
+
+    # One bulk write, True when the server accepted it
+    def post(self, url, length):
+        self.posts += 1
+        try:
+            data = memoryview(self.body)[:length]
+            if _COPY_BODY:
+                data = bytes(data)
+            response = self.session.post(url, data=data, headers=HEADERS, timeout=self.timeout)
+        except (OSError, RuntimeError, ValueError) as e:
+            self.last_status = 0
+            print(f"Upload failed: {e}")
+            return False
+        try:
+            self.last_status = response.status_code
+        finally:
+            response.close()  # hands the kept-alive socket back for the next post
+        if not 200 <= self.last_status < 300:
+            print(f"Upload rejected: HTTP {self.last_status}")
+            return False
+        return True
+
+    def _failed(self, now):
+        self.failures += 1
+        self.backoff = min(max(self.backoff * 2, self.min_backoff), self.max_backoff)
+        self.next_time = now + self.backoff
+
+    # Readings logged but not uploaded yet
+    def backlog(self):
+        return self.log.backlog(self.cursor)
+
+    # Scheduler task body, one HTTP request per step; yields seconds until the next step
+    def steps(self):
+        while True:
+            now = time.monotonic()
+            if now < self.next_time:
+                yield self.next_time - now
+                continue
+            nbytes = self.log.peek(self.chunk, self.cursor)
+            if not nbytes:
+                self.next_time = now + self.interval
+                continue
+            accepted = True
+            for index in range(len(self.pins)):
+                pin, attr, places = self.pins[index]
+                length = self.render(nbytes, attr, places)
+                yield 0
+                if not self.post(self.urls[index], length):
+                    accepted = False
+                    break
+            now = time.monotonic()
+            if not accepted:
+                # Datastreams already posted are sent again, the server keeps one value per timestamp
+                self._failed(now)
+                continue
+            self.log.advance(nbytes, self.cursor)
+            self.uploads += 1
+            self.uploaded += nbytes // smStore.RECORD_SIZE
+            self.backoff = 0
+            # Keep going while readings are waiting (chunks stop at segment ends), then wait for the interval
+            self.next_time = now if self.backlog() else now + self.interval
+
+    def report(self):
+        return (f"upload posts={self.posts} uploads={self.uploads} readings={self.uploaded} "
+                f"failures={self.failures} backlog={self.backlog()} status={self.last_status} "
+                f"backoff={self.backoff}")
@@ -0,0 +1,144 @@
+'''
+Class definition for an array of analog soil moisture probes on one board,
+the channels are sampled in an interleaved burst and all filter state is kept
+in flat per-channel lists so one pass updates every channel. The EMA, moisture
+conversion and stability test follow the smSensor ones, inlined in _filter
+'''
+try:
+    import analogio
+    import digitalio
+except ImportError:
+    analogio = digitalio = None  # host benchmark passes ready-made inputs, see tools/bench_array.py
+
+import smFormat
+
+HISTORY = 4  # smSensor.STABLE_WINDOW, unrolled in _filter
+
+class SoilMoistureArray:
+    def __init__(self, moisture_pins, threshold_pins, min_voltage=3.0, max_voltage=1.80, alpha=0.3, burst=1,
+                 stable_tolerance=0.005):
+        """Initialize one AnalogIn and threshold input per channel (e.g. board.A0-A2), stable_tolerance
+        is the largest step (V) a stable channel accepts. Any pin may also be an object that already
+        has a .value, like SoilMoistureSensor accepts"""
+        if len(moisture_pins) != len(threshold_pins):
+            raise ValueError("Need one threshold pin per moisture pin")
+        self.count = len(moisture_pins)
+        self.sensors = [pin if hasattr(pin, "value") else analogio.AnalogIn(pin) for pin in moisture_pins]
+        self.thresholds = []
+        for pin in threshold_pins:
+            if hasattr(pin, "value"):
+                self.thresholds.append(pin)
+                continue
+            threshold = digitalio.DigitalInOut(pin)
+            threshold.direction = digitalio.Direction.INPUT
+            threshold.pull = digitalio.Pull.UP
+            self.thresholds.append(threshold)
+        self.min_voltage = min_voltage
+        self.max_voltage = max_voltage
+        self.alpha = alpha
+        self.stable_tolerance = stable_tolerance
+        self.burst = burst  # samples per channel per scan, 1 matches SoilMoistureSensor
+        # Per channel state, index = channel; plain lists, reading a float from array('f') allocates
+        self.raw_sum = [0] * self.count
+        self.volts = [0.0] * self.count
+        self.ema_voltage = [0.0] * self.count
+        self.moisture = [0.0] * self.count
+        self.threshold_state = [False] * self.count
+        self.stable = [False] * self.count
+        # Stability history, HISTORY entries per channel, oldest first
+        self.history = [0.0] * (self.count * HISTORY)
+        self.history_len = [0] * self.count
+        self.primed = False
+
+    def scan(self):
+        """Sample every channel in an interleaved burst, then filter all channels in one pass"""
+        raw_sum = self.raw_sum
+        sensors = self.sensors
+        count = self.count
+        if self.burst == 1:
+            for ch in range(count):
+                raw_sum[ch] = sensors[ch].value
+        else:
+            for ch in range(count):
+                raw_sum[ch] = 0
+            # Interleave channels so slow drift hits every probe equally
+            for _ in range(self.burst):
+                for ch in range(count):
+                    raw_sum[ch] += sensors[ch].value
+        thresholds = self.thresholds
+        threshold_state = self.threshold_state
+        for ch in range(count):
+            threshold_state[ch] = thresholds[ch].value
+        self._filter()
+
+    def _filter(self):
+        """EMA, moisture conversion and stability update over all channels, the smSensor
+        ema_update, to_moisture and steps_within math inlined on locals"""
+        scale = 3.3 / (65535 * self.burst)
+        alpha = self.alpha
+        keep = 1 - alpha
+        min_voltage = self.min_voltage
+        span = 100 / (self.max_voltage - min_voltage)
+        tolerance = self.stable_tolerance
+        raw_sum = self.raw_sum
+        volts = self.volts
+        ema = self.ema_voltage
+        moisture = self.moisture
+        history = self.history
+        history_len = self.history_len
+        stable = self.stable
+        primed = self.primed
+        base = 0
+        for ch in range(self.count):
+            v = raw_sum[ch] * scale
+            volts[ch] = v
+            e = alpha * v + keep * ema[ch] if primed else v
+            ema[ch] = e
+            m = (e - min_voltage) * span
+            moisture[ch] = 0 if m < 0 else (100 if m > 100 else m)
+            # Shift this channel's window and test the last three differences
+            h1 = history[base + 1]
+            h2 = history[base + 2]
+            h3 = history[base + 3]
+            history[base] = h1
+            history[base + 1] = h2
+            history[base + 2] = h3
+            history[base + 3] = e
+            if history_len[ch] < HISTORY - 1:
+                history_len[ch] += 1  # full on the HISTORY-th sample, like SoilMoistureSensor.voltage_stable
+                stable[ch] = False
+            else:
+                d1 = h2 - h1
+                d2 = h3 - h2
+                d3 = e - h3
+                stable[ch] = (-tolerance <= d1 <= tolerance and -tolerance <= d2 <= tolerance
+                              and -tolerance <= d3 <= tolerance)
+            base += HISTORY
+        self.primed = True
+
+    def render(self, buf, now):
+        """Write all channels as one message into buf, return the number of bytes used"""
+        pos = smFormat.write_bytes(buf, 0, b"[")
+        pos = smFormat.write_uint(buf, pos, now.tm_mon, 2)
+        pos = smFormat.write_bytes(buf, pos, b"/")
+        pos = smFormat.write_uint(buf, pos, now.tm_mday, 2)
+        pos = smFormat.write_bytes(buf, pos, b"/")
+        pos = smFormat.write_uint(buf, pos, now.tm_year)
+        pos = smFormat.write_bytes(buf, pos, b" ")
+        pos = smFormat.write_uint(buf, pos, now.tm_hour, 2)
+        pos = smFormat.write_bytes(buf, pos, b":")
+        pos = smFormat.write_uint(buf, pos, now.tm_min, 2)
+        pos = smFormat.write_bytes(buf, pos, b":")
+        pos = smFormat.write_uint(buf, pos, now.tm_sec, 2)
+        pos = smFormat.write_bytes(buf, pos, b"]")
+        for ch in range(self.count):
+            pos = smFormat.write_bytes(buf, pos, b" CH" if ch == 0 else b"; CH")
+            pos = smFormat.write_uint(buf, pos, ch)
+            pos = smFormat.write_bytes(buf, pos, b" Voltage: ")
+            pos = smFormat.write_fixed(buf, pos, self.ema_voltage[ch], 3, 1000)
+            pos = smFormat.write_bytes(buf, pos, b"V, Moisture: ")
+            pos = smFormat.write_fixed(buf, pos, self.moisture[ch], 1, 10)
+            pos = smFormat.write_bytes(buf, pos, b"%, Threshold: ")
+            pos = smFormat.write_bytes(buf, pos, b"True" if self.threshold_state[ch] else b"False")
+            pos = smFormat.write_bytes(buf, pos, b" *" if self.stable[ch] else b" +")
+        return pos
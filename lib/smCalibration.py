@@ -0,0 +1,101 @@
+'''
+Class definition for a precomputed calibration table that maps raw 16 bit ADC
+counts to moisture percent, built from multi-point calibration data so non-linear
+probes can be corrected with an index lookup plus an integer interpolation
+'''
+import struct
+from array import array
+
+# File header: magic, table bits, entry count
+_MAGIC = b"SMCL"
+_HEADER = "<4sHH"
+_ADC_BITS = 16
+_SCALE = 100  # table entries are hundredths of a percent
+
+def voltage_to_counts(voltage):
+    """Convert a voltage back to raw AnalogIn counts"""
+    return int(voltage * 65535 / 3.3 + 0.5)
+
+class CalibrationTable:
+    def __init__(self, table, bits=8):
+        """Wrap a table of 2**bits + 1 entries in hundredths of a percent"""
+        if len(table) != (1 << bits) + 1:
+            raise ValueError("Calibration table needs 2**bits + 1 entries")
+        self.bits = bits
+        self.shift = _ADC_BITS - bits
+        self.mask = (1 << self.shift) - 1
+        self.table = table
+
+    @classmethod
+    def from_points(cls, points, bits=8):
+        """Build the table from (raw_counts, moisture_percent) calibration points"""
+        points = sorted(points)
+        if len(points) < 2:
+            raise ValueError("Need at least two calibration points")
+        table = array('H', [0] * ((1 << bits) + 1))
+        step = 1 << (_ADC_BITS - bits)
+        seg = 0
+        for i in range(len(table)):
+            raw = min(i * step, 65535)
+            # Advance to the segment containing raw, extrapolation is clamped below
+            while seg < len(points) - 2 and raw > points[seg + 1][0]:
+                seg += 1
+            x0, y0 = points[seg]
+            x1, y1 = points[seg + 1]
+            y = y0 + (y1 - y0) * (raw - x0) / (x1 - x0) if x1 != x0 else y0
+            y = max(0, min(100, y))  # Clamp values between 0-100%
+            table[i] = int(y * _SCALE + 0.5)
+        return cls(table, bits)
+
+    @classmethod
+    def from_voltages(cls, points, bits=8):
+        """Build the table from (voltage, moisture_percent) calibration points"""
+        return cls.from_points([(voltage_to_counts(v), m) for v, m in points], bits)
+
+    @classmethod
+    def linear(cls, min_voltage=3.0, max_voltage=1.80, bits=8):
+        """Table equivalent to the two-point formula in SoilMoistureSensor"""
+        return cls.from_voltages([(min_voltage, 0), (max_voltage, 100)], bits)
+
+    @classmethod
+    def load(cls, path):
+        """Load a table previously written with save()"""
+        with open(path, "rb") as f:
+            magic, bits, count = struct.unpack(_HEADER, f.read(struct.calcsize(_HEADER)))
+            if magic != _MAGIC:
+                raise ValueError(f"Not a calibration file: {path}")
+            table = array('H', [0] * count)
+            f.readinto(table)
+        return cls(table, bits)
+
+    @classmethod
+    def load_csv(cls, path, bits=8):
+        """Build the table from a 'voltage,percent' per line text file"""
+        points = []
+        with open(path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                voltage, moisture = line.split(",")
+                points.append((float(voltage), float(moisture)))
+        return cls.from_voltages(points, bits)
+
+    def save(self, path):
+        """Persist the table to flash (the filesystem must be writable from code)"""
+        with open(path, "wb") as f:
+            f.write(struct.pack(_HEADER, _MAGIC, self.bits, len(self.table)))
+            f.write(self.table)
+
+    def convert(self, raw):
+        """Convert raw counts to moisture in hundredths of a percent"""
+        index = raw >> self.shift
+        frac = raw & self.mask
+        lo = self.table[index]
+        if frac == 0:
+            return lo
+        return lo + (((self.table[index + 1] - lo) * frac) >> self.shift)
+
+    def moisture_percentage(self, raw):
+        """Convert raw counts to moisture percent"""
+        return self.convert(raw) / _SCALE
@@ -0,0 +1,330 @@
+'''
+Filter stages for the soil moisture voltage, composable into a FilterPipeline.
+Every stage has a streaming update() for the board and a batch() that gives the
+same result over a whole recording with NumPy on the host.
+The median stages keep the window sorted in a preallocated array so each new
+sample is one shifted insert and no memory is allocated per sample
+'''
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # batch backend is host only
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for batch filtering")
+
+# Samples per block in the vectorised EMA
+_EMA_BLOCK = 64
+
+class MedianFilter:
+    def __init__(self, window=5):
+        """Running median over the last window samples"""
+        if window < 1:
+            raise ValueError("Median window must be at least 1")
+        self.window = window
+        self.ring = array('f', [0.0] * window)    # samples in arrival order
+        self.sorted = array('f', [0.0] * window)  # the same samples in ascending order
+        self.head = 0
+        self.count = 0
+
+    def _find(self, value, n):
+        """Binary search for the first index in sorted[:n] not less than value"""
+        s = self.sorted
+        lo = 0
+        hi = n
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if s[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def insert(self, value):
+        """Add a sample, dropping the oldest one once the window is full"""
+        s = self.sorted
+        n = self.count
+        if n == self.window:
+            # Remove the oldest sample, closing the gap
+            i = self._find(self.ring[self.head], n)
+            for j in range(i, n - 1):
+                s[j] = s[j + 1]
+            n -= 1
+        else:
+            self.count += 1
+        # Shift larger samples up and drop the new one into place
+        i = n
+        while i > 0 and s[i - 1] > value:
+            s[i] = s[i - 1]
+            i -= 1
+        s[i] = value
+        self.ring[self.head] = value
+        self.head = (self.head + 1) % self.window
+
+    def median(self):
+        """Return the median of the samples currently in the window"""
+        n = self.count
+        if n & 1:
+            return self.sorted[n >> 1]
+        return (self.sorted[(n >> 1) - 1] + self.sorted[n >> 1]) / 2
+
+    def update(self, value):
+        """Add a sample and return the running median"""
+        self.insert(value)
+        return self.median()
+
+    def reset(self):
+        """Forget all samples"""
+        self.head = 0
+        self.count = 0
+
+    def batch(self, samples):
+        """Running median of a whole recording from a fresh state (NumPy)"""
+        _require_numpy()
+        x = np.asarray(samples, dtype=np.float32).astype(np.float64)
+        out = np.empty(len(x))
+        w = self.window
+        head = min(w - 1, len(x))
+        for i in range(head):  # partially filled window while warming up
+            out[i] = np.median(x[:i + 1])
+        if len(x) >= w:
+            out[w - 1:] = np.median(np.lib.stride_tricks.sliding_window_view(x, w), axis=1)
+        return out
+
+class HampelFilter(MedianFilter):
+    def __init__(self, window=5, n_sigmas=3.0, min_deviation=0.01):
+        """Replace samples further than n_sigmas robust deviations (at least min_deviation volts)
+        from the window median with the median, pass everything else through unchanged"""
+        super().__init__(window)
+        self.n_sigmas = n_sigmas
+        self.min_deviation = min_deviation
+        self.deviations = array('f', [0.0] * window)
+        self.rejected = 0
+
+    def mad(self, centre):
+        """Median absolute deviation of the window around centre"""
+        d = self.deviations
+        n = self.count
+        # Insertion sort of the deviations, the window is small
+        for k in range(n):
+            value = abs(self.sorted[k] - centre)
+            i = k
+            while i > 0 and d[i - 1] > value:
+                d[i] = d[i - 1]
+                i -= 1
+            d[i] = value
+        if n & 1:
+            return d[n >> 1]
+        return (d[(n >> 1) - 1] + d[n >> 1]) / 2
+
+    def update(self, value):
+        """Add a sample and return it, or the window median if it is an outlier"""
+        self.insert(value)
+        centre = self.median()
+        limit = self.n_sigmas * 1.4826 * self.mad(centre)  # 1.4826 scales MAD to a standard deviation
+        if limit < self.min_deviation:
+            limit = self.min_deviation
+        if abs(value - centre) > limit:
+            self.rejected += 1
+            return centre
+        return value
+
+    def batch(self, samples):
+        """Hampel output of a whole recording from a fresh state (NumPy)"""
+        _require_numpy()
+        x = np.asarray(samples, dtype=np.float32).astype(np.float64)
+        centre = MedianFilter.batch(self, x)
+        mad = np.empty(len(x))
+        w = self.window
+        for i in range(min(w - 1, len(x))):  # partially filled window while warming up
+            mad[i] = np.median(np.abs(x[:i + 1] - centre[i]))
+        if len(x) >= w:
+            windows = np.lib.stride_tricks.sliding_window_view(x, w)
+            mad[w - 1:] = np.median(np.abs(windows - centre[w - 1:, None]), axis=1)
+        limit = np.maximum(self.n_sigmas * 1.4826 * mad, self.min_deviation)
+        return np.where(np.abs(x - centre) > limit, centre, x)
+
+class EMAStage:
+    def __init__(self, alpha=0.3):
+        """Exponential moving average, the first sample initializes the average"""
+        self.alpha = alpha
+        self.value = None
+
+    def update(self, value):
+        """Add a sample and return the average"""
+        if self.value is None:
+            self.value = value
+        else:
+            self.value = (self.alpha * value) + ((1 - self.alpha) * self.value)
+        return self.value
+
+    def reset(self):
+        """Forget the average"""
+        self.value = None
+
+    def batch(self, samples):
+        """EMA of a whole recording from a fresh state (NumPy)"""
+        _require_numpy()
+        return _ema_batch(np.asarray(samples, dtype=np.float64), self.alpha)
+
+class KalmanStage:
+    def __init__(self, process_noise=1e-5, measurement_noise=1e-3):
+        """Scalar Kalman filter for a slowly varying level (random walk model), noise given as variances"""
+        self.q = process_noise
+        self.r = measurement_noise
+        self.value = None
+        self.p = 0.0
+
+    def update(self, value):
+        """Add a measurement and return the estimate"""
+        if self.value is None:
+            self.value = value
+            self.p = self.r
+            return value
+        self.p += self.q
+        gain = self.p / (self.p + self.r)
+        self.value += gain * (value - self.value)
+        self.p *= 1 - gain
+        return self.value
+
+    def reset(self):
+        """Forget the estimate"""
+        self.value = None
+        self.p = 0.0
+
+    def batch(self, samples):
+        """Kalman estimates of a whole recording from a fresh state (NumPy)"""
+        _require_numpy()
+        x = np.asarray(samples, dtype=np.float64)
+        out = np.empty(len(x))
+        if not len(x):
+            return out
+        # The gain sequence does not depend on the data, iterate it until it settles
+        # then the filter is an EMA with alpha = steady state gain
+        out[0] = value = x[0]
+        p = self.r
+        gain = 0.0
+        i = 1
+        while i < len(x):
+            p += self.q
+            new_gain = p / (p + self.r)
+            p *= 1 - new_gain
+            value += new_gain * (x[i] - value)
+            out[i] = value
+            i += 1
+            if abs(new_gain - gain) < 1e-12:
+                break
+            gain = new_gain
+        if i < len(x):
+            out[i:] = _ema_batch(x[i:], new_gain, value)
+        return out
+
+class DecimatorStage:
+    def __init__(self, factor=10):
+        """Average each block of factor samples into one output, other samples return None"""
+        if factor < 1:
+            raise ValueError("Decimation factor must be at least 1")
+        self.factor = factor
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, value):
+        """Add a sample, return the block average on every factor-th sample else None"""
+        self.total += value
+        self.count += 1
+        if self.count < self.factor:
+            return None
+        result = self.total / self.factor
+        self.total = 0.0
+        self.count = 0
+        return result
+
+    def reset(self):
+        """Drop the partial block"""
+        self.total = 0.0
+        self.count = 0
+
+    def batch(self, samples):
+        """Block averages of a whole recording from a fresh state, partial last block dropped (NumPy)"""
+        _require_numpy()
+        x = np.asarray(samples, dtype=np.float64)
+        blocks = len(x) // self.factor
+        return x[:blocks * self.factor].reshape(blocks, self.factor).mean(axis=1)
+
+class FilterPipeline:
+    def __init__(self, stages):
+        """Chain of filter stages, each stage feeds the next"""
+        self.stages = list(stages)
+
+    def update(self, value):
+        """Run one sample through every stage, None when a decimator holds it back"""
+        for stage in self.stages:
+            value = stage.update(value)
+            if value is None:
+                return None
+        return value
+
+    def reset(self):
+        """Reset every stage"""
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, samples):
+        """Streaming backend, feed a sequence of samples and return the emitted outputs"""
+        out = []
+        for value in samples:
+            value = self.update(value)
+            if value is not None:
+                out.append(value)
+        return out
+
+    def batch(self, samples):
+        """NumPy backend, same outputs as process() on a freshly reset pipeline"""
+        _require_numpy()
+        x = np.asarray(samples, dtype=np.float64)
+        for stage in self.stages:
+            x = stage.batch(x)
+        return x
+
+def _ema_batch(x, alpha, initial=None):
+    """Vectorised EMA in blocks, initial is the average before x[0] (None starts from x[0])"""
+    n = len(x)
+    out = np.empty(n)
+    if not n:
+        return out
+    keep = 1 - alpha
+    block = _EMA_BLOCK
+    # weights[k, j] = alpha * keep**(k - j) for j <= k, the response of one block to its inputs
+    k = np.arange(block)
+    powers = keep ** k
+    weights = np.tril(alpha * keep ** np.subtract.outer(k, k).clip(0))
+    carry = keep ** (k + 1)  # how the average entering a block decays across it
+    blocks = n // block
+    prev = x[0] if initial is None else initial
+    if blocks:
+        responses = x[:blocks * block].reshape(blocks, block) @ weights.T
+        ends = responses[:, -1]
+        decay = powers[-1] * keep
+        # Average entering each block, a short scalar recursion over the blocks
+        starts = np.empty(blocks)
+        for b in range(blocks):
+            starts[b] = prev
+            prev = ends[b] + decay * prev
+        out[:blocks * block] = (responses + np.outer(starts, carry)).ravel()
+    for i in range(blocks * block, n):
+        prev = alpha * x[i] + keep * prev
+        out[i] = prev
+    return out
+
+def make_spike_filter(kind, window=5):
+    """Return a spike filter by name ("median" or "hampel"), None passes through"""
+    if kind is None:
+        return None
+    if kind == "median":
+        return MedianFilter(window)
+    if kind == "hampel":
+        return HampelFilter(window)
+    raise ValueError(f"Unknown spike filter: {kind}")
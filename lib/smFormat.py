@@ -0,0 +1,205 @@
+'''
+Allocation free formatting of sensor readings into a preallocated bytearray.
+Templates use str.format() syntax and are compiled once into a list of
+literal and field operations, numbers are written digit by digit so a
+response can be produced without building any intermediate strings
+'''
+import time
+
+# Fields that a template may reference, in the order they are stored
+FIELDS = ("year", "mon", "mday", "hour", "min", "sec",
+          "volts", "voltage", "moisture", "threshold", "marker", "raw", "seq", "health")
+
+# Operation kinds produced by the template compiler
+_LITERAL = 0
+_INT = 1
+_FIXED = 2
+_BOOL = 3
+_MARKER = 4
+
+# Reading formats used by the scripts, byte-identical to their old f-strings
+UDP_TEMPLATE = ("[{mon:02d}/{mday:02d}/{year} {hour:02d}:{min:02d}:{sec:02d}] "
+                "Voltage: {voltage:.3f}V, Moisture: {moisture:.1f}%, "
+                "Threshold: {threshold} {marker}")
+SERIAL_TEMPLATE = ("[{mon:02d}/{mday:02d}/{year} {hour:02d}:{min:02d}:{sec:02d}] "
+                   "Reading: {volts:.3f}V, Voltage: {voltage:.3f}V, Moisture: {moisture:.1f}%, "
+                   "Threshold: {threshold} {marker}")
+# UDP reading prefixed with its sequence number, lets collectors spot lost datagrams
+SEQ_UDP_TEMPLATE = "#{seq} " + UDP_TEMPLATE
+# Sequenced reading followed by its smReading health flags, H0 = probe looks fine
+HEALTH_UDP_TEMPLATE = SEQ_UDP_TEMPLATE + " H{health}"
+# Same layout as json.dumps() of the archive http_response() OrderedDict
+JSON_TEMPLATE = ('{{"sm_timestamp": "{mday:02d}/{mon:02d}/{year} {hour:02d}:{min:02d}:{sec:02d}", '
+                 '"sm_raw_moisture": {raw}, "sm_filtered_moisture": {moisture:.1f}}}')
+# JSON reading with its sequence number (for NACK gap fill) and health flags added as more keys
+HEALTH_JSON_TEMPLATE = JSON_TEMPLATE[:-2] + ', "sm_seq": {seq}, "sm_health": {health}}}'
+
+
+def write_uint(buf, pos, value, width=0):
+    """Write a non-negative integer as ASCII digits at pos, zero padded to width, return the new end"""
+    digits = 1
+    v = value
+    while v >= 10:
+        v //= 10
+        digits += 1
+    if digits < width:
+        digits = width
+    end = pos + digits
+    i = end
+    while i > pos:
+        i -= 1
+        buf[i] = 48 + value % 10
+        value //= 10
+    return end
+
+
+def _float_epsilon():
+    eps = 1.0
+    while 1.0 + eps / 2 != 1.0:
+        eps /= 2
+    return eps
+
+
+# Relative precision of this platform's floats (CircuitPython's are narrower than CPython's)
+_EPSILON = _float_epsilon()
+_FIXED_FORMATS = ("%.0f", "%.1f", "%.2f", "%.3f", "%.4f", "%.5f", "%.6f")
+
+
+def write_fixed(buf, pos, value, places, scale):
+    """Write a float with a fixed number of decimal places (scale = 10**places), return the new end,
+    rounded exactly like an f-string"""
+    if value < 0:
+        buf[pos] = 45  # '-'
+        pos += 1
+        value = -value
+    product = value * scale
+    scaled = int(product)
+    fraction = product - scaled
+    band = (product + 1) * _EPSILON * 4  # rounding error of the product
+    if fraction > 0.5 + band:
+        scaled += 1
+    elif fraction >= 0.5 - band and places < len(_FIXED_FORMATS):
+        # Too close to a tie to tell from the product, let the float formatter round the exact binary
+        # value as f-strings do; rare, so the string it allocates does not matter
+        text = _FIXED_FORMATS[places] % value
+        scaled = int(text.replace(".", ""))
+    elif fraction >= 0.5:
+        scaled += 1
+    pos = write_uint(buf, pos, scaled // scale)
+    if places:
+        buf[pos] = 46  # '.'
+        pos = write_uint(buf, pos + 1, scaled % scale, places)
+    return pos
+
+
+def write_bytes(buf, pos, data):
+    """Copy data into buf at pos without creating a slice object, return the new end"""
+    for i in range(len(data)):
+        buf[pos + i] = data[i]
+    return pos + len(data)
+
+
+def compile_template(template):
+    """Compile a str.format() style template into a list of (kind, arg, field) operations"""
+    ops = []
+    literal = ""
+    i = 0
+    n = len(template)
+    while i < n:
+        c = template[i]
+        if c in "{}" and i + 1 < n and template[i + 1] == c:
+            literal += c  # escaped brace
+            i += 2
+            continue
+        if c == "}":
+            raise ValueError("Single '}' in template")
+        if c != "{":
+            literal += c
+            i += 1
+            continue
+        end = template.find("}", i)
+        if end < 0:
+            raise ValueError("Unterminated field in template")
+        if literal:
+            ops.append((_LITERAL, literal.encode(), 0))
+            literal = ""
+        parts = template[i + 1:end].split(":", 1)
+        name = parts[0]
+        spec = parts[1] if len(parts) > 1 else ""
+        if name not in FIELDS:
+            raise ValueError(f"Unknown template field: {name}")
+        field = FIELDS.index(name)
+        if name == "threshold":
+            ops.append((_BOOL, 0, field))
+        elif name == "marker":
+            ops.append((_MARKER, 0, field))
+        elif spec.endswith("f"):
+            places = int(spec[1:-1]) if spec.startswith(".") else 6
+            ops.append((_FIXED, places, field))
+        else:
+            width = int(spec[:-1]) if spec.endswith("d") and len(spec) > 1 else 0
+            ops.append((_INT, width, field))
+        i = end + 1
+    if literal:
+        ops.append((_LITERAL, literal.encode(), 0))
+    return ops
+
+
+class ReadingFormatter:
+    def __init__(self, template=UDP_TEMPLATE, size=128):
+        """Compile the template and preallocate the output buffer"""
+        self.template = template
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self._ops = compile_template(template)
+        self._scales = [10 ** places if kind == _FIXED else 0 for kind, places, _ in self._ops]
+        self._values = [0] * len(FIELDS)
+
+    def render(self, now, volts, voltage, moisture, threshold, stable, raw=0, seq=0, health=0):
+        """Write one reading into the buffer and return the number of bytes used"""
+        values = self._values
+        values[0] = now.tm_year
+        values[1] = now.tm_mon
+        values[2] = now.tm_mday
+        values[3] = now.tm_hour
+        values[4] = now.tm_min
+        values[5] = now.tm_sec
+        values[6] = volts
+        values[7] = voltage
+        values[8] = moisture
+        values[9] = threshold
+        values[10] = stable
+        values[11] = raw
+        values[12] = seq
+        values[13] = health
+        buf = self.buffer
+        scales = self._scales
+        pos = 0
+        for i in range(len(self._ops)):
+            kind, arg, field = self._ops[i]
+            if kind == _LITERAL:
+                pos = write_bytes(buf, pos, arg)
+            elif kind == _INT:
+                value = values[field]
+                if value < 0:
+                    buf[pos] = 45  # '-'
+                    pos += 1
+                    value = -value
+                pos = write_uint(buf, pos, value, arg)
+            elif kind == _FIXED:
+                pos = write_fixed(buf, pos, values[field], arg, scales[i])
+            elif kind == _BOOL:
+                pos = write_bytes(buf, pos, b"True" if values[field] else b"False")
+            else:
+                buf[pos] = 42 if values[field] else 43  # '*' stable, '+' settling
+                pos += 1
+        return pos
+
+    def render_reading(self, reading, raw=0):
+        """Render a smReading.Reading, its epoch timestamp is shown as local time"""
+        return self.render(time.localtime(reading.timestamp), reading.volts, reading.voltage, reading.moisture,
+                           reading.threshold, reading.stable, raw=raw, seq=reading.seq, health=reading.health)
+
+    def payload(self, length):
+        """Return a zero-copy view of the first length bytes of the buffer, ready for sendto()"""
+        return self.view[:length]
@@ -0,0 +1,74 @@
+'''
+Class definition for a ring of recently sent readings keyed by sequence number,
+so a collector that sees a gap in the sequence can NACK the missing range and
+have those readings sent again
+'''
+import smReading
+
+RECORD_SIZE = smReading.RECORD_SIZE
+
+def parse_nack(msg, limit=8):
+    """Parse 'NACK 12-15,18' into [(12, 15), (18, 18)], at most limit ranges"""
+    ranges = []
+    parts = msg.split()
+    if len(parts) < 2:
+        return ranges
+    for part in parts[1].split(","):
+        bounds = part.split("-")
+        try:
+            first = int(bounds[0])
+            last = int(bounds[-1])
+        except ValueError:
+            continue
+        if last >= first:
+            ranges.append((first, last))
+        if len(ranges) == limit:
+            break
+    return ranges
+
+class ReadingHistory:
+    def __init__(self, size=64):
+        """Keep the last size readings packed (smReading layout) in a preallocated buffer"""
+        self.size = size
+        self.buffer = bytearray(size * RECORD_SIZE)
+        self.next_seq = 0  # sequence number of the next reading
+        self.resent = 0
+        self._cursor = smReading.Reading()
+
+    def add(self, reading):
+        """Give a smReading.Reading the next sequence number, store it and return the number"""
+        seq = self.next_seq
+        reading.seq = seq
+        reading.pack_into(self.buffer, (seq % self.size) * RECORD_SIZE)
+        self.next_seq = (seq + 1) & 0xFFFFFFFF
+        return seq
+
+    def oldest(self):
+        """Sequence number of the oldest reading still held"""
+        return max(0, self.next_seq - self.size)
+
+    def get(self, seq, into=None):
+        """Return the reading (loaded into the given Reading, or a new one) or None if no longer held"""
+        if seq < self.oldest() or seq >= self.next_seq:
+            return None
+        if into is None:
+            into = smReading.Reading()
+        into.load(self.buffer, (seq % self.size) * RECORD_SIZE)
+        if into.seq != seq:
+            return None
+        return into
+
+    def resend(self, ranges, send):
+        """Call send(reading) for every held reading in the NACKed ranges (one reused Reading),
+        return the sequence numbers that could not be resent as a list of ranges"""
+        missing = []
+        oldest = self.oldest()
+        for first, last in ranges:
+            last = min(last, self.next_seq - 1)
+            if first < oldest:
+                missing.append((first, min(last, oldest - 1)))
+                first = oldest
+            for seq in range(first, last + 1):
+                send(self.get(seq, self._cursor))
+                self.resent += 1
+        return missing
@@ -0,0 +1,120 @@
+'''
+Class definition for one sensor reading, shared by the sensor, the reading
+history, the formatters and the collectors. A Reading has fixed __slots__
+and packs to a fixed struct layout, so readings can be kept in preallocated
+buffers and walked with a ReadingView without building a tuple per reading
+'''
+import struct
+
+# Packed reading: sequence, epoch seconds, volts, voltage, moisture, flags
+RECORD = "<IIfffB"
+RECORD_SIZE = struct.calcsize(RECORD)
+FLAG_THRESHOLD = 0x01
+FLAG_STABLE = 0x02
+# Sensor health, set by smSensor.SensorHealth
+FLAG_NOISY = 0x04  # ADC noise floor above the limit
+FLAG_STUCK = 0x08  # raw value has not moved for a long run of samples
+FLAG_RAIL_LOW = 0x10  # moisture clamped at 0%
+FLAG_RAIL_HIGH = 0x20  # moisture clamped at 100%
+FLAG_STEP = 0x40  # sudden step between consecutive samples
+HEALTH_MASK = FLAG_NOISY | FLAG_STUCK | FLAG_RAIL_LOW | FLAG_RAIL_HIGH | FLAG_STEP
+
+# Byte offset and struct format of each field inside a packed reading
+FIELDS = {
+    "seq": (0, "<I"),
+    "timestamp": (4, "<I"),
+    "volts": (8, "<f"),
+    "voltage": (12, "<f"),
+    "moisture": (16, "<f"),
+    "flags": (20, "<B"),
+}
+
+class Reading:
+    __slots__ = ("seq", "timestamp", "volts", "voltage", "moisture", "flags")
+
+    def __init__(self, seq=0, timestamp=0, volts=0.0, voltage=0.0, moisture=0.0, flags=0):
+        """Raw volts, filtered voltage, moisture percentage, epoch timestamp and flag bits"""
+        self.seq = seq
+        self.timestamp = timestamp
+        self.volts = volts
+        self.voltage = voltage
+        self.moisture = moisture
+        self.flags = flags
+
+    @property
+    def threshold(self):
+        """State of the threshold input"""
+        return bool(self.flags & FLAG_THRESHOLD)
+
+    @property
+    def stable(self):
+        """True when the filtered voltage has settled"""
+        return bool(self.flags & FLAG_STABLE)
+
+    @property
+    def health(self):
+        """Sensor health flag bits, 0 when the probe looks fine"""
+        return self.flags & HEALTH_MASK
+
+    def set(self, timestamp, volts, voltage, moisture, threshold, stable, seq=0, health=0):
+        """Fill the reading in place and return it"""
+        self.seq = seq
+        self.timestamp = int(timestamp)
+        self.volts = volts
+        self.voltage = voltage
+        self.moisture = moisture
+        self.flags = (FLAG_THRESHOLD if threshold else 0) | (FLAG_STABLE if stable else 0) | health
+        return self
+
+    def copy_from(self, other):
+        """Copy every field of another reading into this one and return it"""
+        self.seq = other.seq
+        self.timestamp = other.timestamp
+        self.volts = other.volts
+        self.voltage = other.voltage
+        self.moisture = other.moisture
+        self.flags = other.flags
+        return self
+
+    def pack_into(self, buf, offset=0):
+        """Pack the reading into buf at offset"""
+        struct.pack_into(RECORD, buf, offset, self.seq & 0xFFFFFFFF, self.timestamp,
+                         self.volts, self.voltage, self.moisture, self.flags)
+
+    def load(self, buf, offset=0):
+        """Fill the reading from a packed reading in buf at offset and return it"""
+        (self.seq, self.timestamp, self.volts, self.voltage, self.moisture,
+         self.flags) = struct.unpack_from(RECORD, buf, offset)
+        return self
+
+class ReadingView:
+    def __init__(self, buf, count=None, offset=0):
+        """View over count packed readings in buf starting at offset, nothing is copied"""
+        self.buf = buf
+        self.offset = offset
+        if count is None:
+            count = (len(buf) - offset) // RECORD_SIZE
+        self.count = count
+        self._cursor = Reading()
+
+    def __len__(self):
+        return self.count
+
+    def get(self, index, into=None):
+        """Reading at index, loaded into the given Reading (or a new one)"""
+        if index < 0 or index >= self.count:
+            raise IndexError("reading index out of range")
+        if into is None:
+            into = Reading()
+        return into.load(self.buf, self.offset + index * RECORD_SIZE)
+
+    def field(self, index, name):
+        """A single field of the reading at index, without unpacking the rest"""
+        position, fmt = FIELDS[name]
+        return struct.unpack_from(fmt, self.buf, self.offset + index * RECORD_SIZE + position)[0]
+
+    def __iter__(self):
+        """Walk the readings through one reused Reading, copy_from() any that must be kept"""
+        cursor = self._cursor
+        for index in range(self.count):
+            yield cursor.load(self.buf, self.offset + index * RECORD_SIZE)
@@ -0,0 +1,100 @@
+'''
+Sampling schedulers for the soil moisture scripts, decide when the next
+reading should be taken
+'''
+import time
+
+import smTicks
+
+_MS_PER_S = 1000
+
+class AdaptiveInterval:
+    def __init__(self, min_interval=1.0, max_interval=60.0, backoff=2.0, rate_threshold=0.002):
+        """Sampling interval bounds in seconds, rate_threshold is in volts per second"""
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Need 0 < min_interval <= max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.rate_threshold = rate_threshold
+        self.interval = min_interval
+        self.last_voltage = None
+        self.last_time = None
+        self.rate = 0.0
+
+    def update(self, voltage, stable, now):
+        """Feed the latest filtered voltage and stability flag, return the next interval"""
+        if self.last_time is not None and now > self.last_time:
+            self.rate = abs(voltage - self.last_voltage) / (now - self.last_time)
+        self.last_voltage = voltage
+        self.last_time = now
+        if not stable or self.rate > self.rate_threshold:
+            # Transient (e.g. irrigation wet-down), sample as fast as allowed
+            self.interval = self.min_interval
+        else:
+            # Quiet soil, back off exponentially
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval
+
+class PeriodicSampler:
+    def __init__(self, period, sleeper=None):
+        """Deadline based periodic timer, period in seconds, sleeper (e.g. cPyPower.LightSleep)
+        replaces time.sleep() for the wait between deadlines. Deadlines are smTicks ms ticks"""
+        self.period_ms = int(period * _MS_PER_S)
+        self.sleeper = sleeper
+        self.active_ms = 0  # time between wait() calls, i.e. spent on the caller's work
+        self.idle_ms = 0  # time spent sleeping in wait()
+        self._returned = None  # when wait() last returned
+        self.deadline = None
+        self.samples = 0
+        self.overruns = 0
+        self.jitter_sum_ms = 0
+        self.jitter_max_ms = 0
+
+    def set_period(self, period):
+        """Change the period, the next deadline is measured from the last scheduled one"""
+        period_ms = int(period * _MS_PER_S)
+        if self.deadline is not None:
+            self.deadline = smTicks.ticks_add(self.deadline, period_ms - self.period_ms)
+        self.period_ms = period_ms
+
+    def wait(self):
+        """Sleep until the next deadline and return it (smTicks ms ticks)"""
+        now = smTicks.ticks_ms()
+        if self._returned is not None:
+            self.active_ms += smTicks.ticks_diff(now, self._returned)
+        if self.deadline is None:
+            self.deadline = now  # First sample is taken immediately
+        late = smTicks.ticks_diff(now, self.deadline)
+        if late > 0:
+            # The previous cycle overran, skip whole missed slots to stay on the grid
+            self.overruns += 1
+            self.deadline = smTicks.ticks_add(self.deadline, (late // self.period_ms) * self.period_ms)
+        elif late < 0:
+            if self.sleeper is not None:
+                self.sleeper.sleep(-late / _MS_PER_S)
+            else:
+                time.sleep(-late / _MS_PER_S)
+            woke = smTicks.ticks_ms()
+            self.idle_ms += smTicks.ticks_diff(woke, now)
+            now = woke
+        deadline = self.deadline
+        jitter = smTicks.ticks_diff(now, deadline)
+        self.samples += 1
+        self.jitter_sum_ms += jitter
+        if jitter > self.jitter_max_ms:
+            self.jitter_max_ms = jitter
+        # Next deadline comes from the schedule, not from when we woke up
+        self.deadline = smTicks.ticks_add(self.deadline, self.period_ms)
+        self._returned = smTicks.ticks_ms()
+        return deadline
+
+    def jitter_stats(self):
+        """Return (samples, mean jitter ms, max jitter ms, overruns)"""
+        mean = self.jitter_sum_ms // self.samples if self.samples else 0
+        return self.samples, mean, self.jitter_max_ms, self.overruns
+
+    def duty_cycle(self):
+        """Fraction of the time spent outside wait(), 0..1"""
+        total = self.active_ms + self.idle_ms
+        return self.active_ms / total if total else 0.0
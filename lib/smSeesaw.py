@@ -0,0 +1,104 @@
+'''
+Class definition for an Adafruit Seesaw capacitive soil probe behind the same
+interface as SoilMoistureSensor, each read is split into a start phase (register
+request) and a fetch phase (result read) so the caller can do other work during
+the probe's conversion delay instead of blocking in seesaw.moisture_read()
+'''
+import time
+
+import smSensor
+import smTicks
+
+# Seesaw touch module register, same as adafruit_seesaw moisture_read()
+_TOUCH_BASE = 0x0F
+_TOUCH_CHANNEL_OFFSET = 0x10
+_CONVERSION_MS = 5  # conversion delay
+_MAX_VALID = 4095  # larger results are conversion glitches and are re-read
+_MAX_RETRIES = 3
+
+class SeesawProbe:
+    def __init__(self, seesaw, conversion_delay=_CONVERSION_MS):
+        """Split phase reader on an adafruit_seesaw.seesaw.Seesaw (addr 0x36 for the soil probe)"""
+        self.device = seesaw.i2c_device
+        self.conversion_delay = conversion_delay  # ms
+        self.request = bytes((_TOUCH_BASE, _TOUCH_CHANNEL_OFFSET))
+        self.result = bytearray(2)
+        self.started = None  # smTicks.ticks_ms() of the pending request
+        self.retries = 0
+        self.value = 0  # last valid capacitance count
+        self.errors = 0
+
+    def start(self):
+        """Send the read request, the result can be fetched after the conversion delay"""
+        with self.device as i2c:
+            i2c.write(self.request)
+        self.started = smTicks.ticks_ms()
+
+    def ready(self):
+        """Return True when a started conversion can be fetched"""
+        return self.started is not None and smTicks.ticks_diff(smTicks.ticks_ms(), self.started) >= self.conversion_delay
+
+    def fetch(self):
+        """Read a finished conversion, return True when value was updated"""
+        if not self.ready():
+            return False
+        with self.device as i2c:
+            i2c.readinto(self.result)
+        self.started = None
+        count = (self.result[0] << 8) | self.result[1]
+        if count > _MAX_VALID:
+            self.errors += 1
+            if self.retries < _MAX_RETRIES:
+                self.retries += 1
+                self.start()  # glitch, request another conversion
+            else:
+                self.retries = 0
+            return False
+        self.retries = 0
+        self.value = count
+        return True
+
+    def read(self):
+        """Blocking read for callers without a scheduler"""
+        for _ in range(_MAX_RETRIES + 1):
+            if self.started is None:
+                self.start()  # fetch() already requested the retry after a glitch
+            time.sleep(self.conversion_delay / 1000)
+            if self.fetch():
+                break
+        return self.value
+
+class _NoThreshold:
+    """The Seesaw probe has no threshold output, report it as never tripped"""
+    value = True
+
+class SeesawMoistureSensor(smSensor.SoilMoistureSensor):
+    def __init__(self, seesaw, threshold_pin=None, min_count=200, max_count=2000, **kwargs):
+        """Initialize on a Seesaw object, 'voltage' is the capacitance count (dry min_count, wet max_count),
+        so filtering, stability (stable_tolerance in counts) and reporting are shared with the analog probe"""
+        if kwargs.get("calibration") is not None:
+            raise ValueError("Calibration tables map ADC counts, not Seesaw capacitance counts")
+        self.probe = SeesawProbe(seesaw)
+        kwargs.setdefault("stable_tolerance", 5)  # counts
+        if kwargs.get("diagnostics", True) is True:
+            # Health limits in counts, scaled from the analog defaults over the dry-wet span; repeated
+            # identical counts are normal for this probe, so the stuck check is off
+            span = abs(max_count - min_count)
+            kwargs["diagnostics"] = smSensor.SensorHealth(noise_limit=span / 60, stuck_limit=0,
+                                                          step_limit=span / 5, resolution=0.5)
+        super().__init__(self.probe, threshold_pin if threshold_pin is not None else _NoThreshold(),
+                         min_voltage=min_count, max_voltage=max_count, **kwargs)
+
+    def start_read(self):
+        """Begin a conversion, call fetch() once it is ready"""
+        self.probe.start()
+
+    def fetch(self):
+        """Collect a finished conversion, return True when a new count is available"""
+        return self.probe.fetch()
+
+    def read_voltage(self):
+        """Return the last fetched capacitance count, reading it blocking if none was started"""
+        if self.probe.started is None and self.probe.value == 0:
+            self.probe.read()
+        return float(self.probe.value)
@@ -2,21 +2,121 @@
 Class definition for soil moisture class that is using an analog sensor for measurement
 of a voltage that is converted to a moisture percentage
 '''
-import analogio
-import digitalio
+try:
+    import analogio
+    import digitalio
+except ImportError:
+    analogio = digitalio = None  # host replay passes ready-made inputs, see tools/replay.py
+import time
+import smReading
+import smStats
+
+# Readings voltage_stable() looks back over (three steps)
+STABLE_WINDOW = 4
+
+def ema_update(previous, sample, alpha):
+    """One exponential moving average step, the first sample (previous None) starts the average"""
+    if previous is None:
+        return sample
+    return (alpha * sample) + ((1 - alpha) * previous)
+
+def to_moisture(voltage, min_voltage, max_voltage):
+    """Linear voltage to moisture percentage between the dry and wet voltages, clamped to 0-100%"""
+    moisture = (voltage - min_voltage) / (max_voltage - min_voltage) * 100
+    return max(0, min(100, moisture))
+
+def steps_within(history, start, end, tolerance):
+    """True when every step between consecutive entries of history[start:end] is within tolerance"""
+    for i in range(start + 1, end):
+        if abs(history[i] - history[i - 1]) > tolerance:
+            return False
+    return True
+
+class SensorHealth:
+    def __init__(self, noise_limit=0.02, stuck_limit=30, step_limit=0.25, alpha=0.1, resolution=0.0001):
+        """Incremental probe diagnostics, O(1) per sample: noise_limit (V) for the smoothed
+        sample-to-sample change, stuck_limit samples without movement beyond resolution (V, 0 turns
+        the stuck check off), step_limit (V) for a sudden jump between consecutive samples"""
+        self.noise_limit = noise_limit
+        self.stuck_limit = stuck_limit
+        self.step_limit = step_limit
+        self.alpha = alpha
+        self.resolution = resolution
+        self.noise = 0.0  # smoothed absolute sample-to-sample change (V), the noise floor
+        self.last_volts = None
+        self.stuck_run = 0
+        self.flags = 0  # health flags of the latest sample
+        self.samples = 0
+        self.flagged = 0  # samples that raised at least one flag
+
+    def update(self, volts, moisture):
+        """Feed the raw voltage and the clamped moisture of one sample, return its health flags"""
+        flags = 0
+        if self.last_volts is not None:
+            delta = abs(volts - self.last_volts)
+            self.noise += self.alpha * (delta - self.noise)
+            if self.noise > self.noise_limit:
+                flags |= smReading.FLAG_NOISY
+            if delta <= self.resolution:
+                self.stuck_run += 1
+                if self.stuck_limit and self.stuck_run >= self.stuck_limit:
+                    flags |= smReading.FLAG_STUCK
+            else:
+                self.stuck_run = 0
+            if delta > self.step_limit:
+                flags |= smReading.FLAG_STEP
+        self.last_volts = volts
+        if moisture <= 0:
+            flags |= smReading.FLAG_RAIL_LOW
+        elif moisture >= 100:
+            flags |= smReading.FLAG_RAIL_HIGH
+        self.samples += 1
+        if flags:
+            self.flagged += 1
+        self.flags = flags
+        return flags
 
 class SoilMoistureSensor:
-    def __init__(self, moisture_pin, threshold_pin, min_voltage=3.0, max_voltage=1.80):
-        """Initialize the soil moisture sensor"""
-        self.sensor = analogio.AnalogIn(moisture_pin)
+    def __init__(self, moisture_pin, threshold_pin, min_voltage=3.0, max_voltage=1.80, calibration=None,
+                 threshold_events=False, spike_filter=None, pipeline=None, stats=None, alpha=0.3,
+                 stable_tolerance=0.005, diagnostics=True):
+        """Initialize the soil moisture sensor, calibration is an optional smCalibration.CalibrationTable,
+        threshold_events tracks the threshold pin with a debounced smThreshold.ThresholdMonitor,
+        spike_filter ("median", "hampel" or a filter object) rejects ADC spikes ahead of the EMA,
+        pipeline is an optional smFilter.FilterPipeline that replaces the spike filter and EMA,
+        stats is an optional smStats.LatencyStats that times the ADC reads and the filter update,
+        alpha is the EMA smoothing factor and stable_tolerance the largest step (V) voltage_stable accepts,
+        diagnostics keeps a SensorHealth (True for the defaults, or a configured one, None to skip it).
+        Either pin may also be an object that already has a .value (e.g. a recorded trace)"""
+        if hasattr(moisture_pin, "value"):
+            self.sensor = moisture_pin
+        else:
+            self.sensor = analogio.AnalogIn(moisture_pin)
         self.min_voltage = min_voltage
         self.max_voltage = max_voltage
-        self.threshold = digitalio.DigitalInOut(threshold_pin)
-        self.threshold.direction = digitalio.Direction.INPUT
-        self.threshold.pull = digitalio.Pull.UP
+        if hasattr(threshold_pin, "value"):
+            self.threshold = threshold_pin
+        elif threshold_events:
+            import smThreshold
+            self.threshold = smThreshold.ThresholdMonitor(threshold_pin)
+        else:
+            self.threshold = digitalio.DigitalInOut(threshold_pin)
+            self.threshold.direction = digitalio.Direction.INPUT
+            self.threshold.pull = digitalio.Pull.UP
         self.voltage_history = []
         self.ema_voltage = None  # Initialize the EMA voltage value
-        self.alpha = 0.3  # Smoothing factor (tweak as needed)
+        self.alpha = alpha  # Smoothing factor (tweak as needed)
+        self.stable_tolerance = stable_tolerance  # Max step between readings considered stable (V)
+        self.calibration = calibration
+        if isinstance(spike_filter, str):
+            import smFilter
+            spike_filter = smFilter.make_spike_filter(spike_filter)
+        self.spike_filter = spike_filter
+        self.pipeline = pipeline
+        self.stats = stats
+        if diagnostics is True:
+            diagnostics = SensorHealth()
+        self.diagnostics = diagnostics
 
     def read_voltage(self):
         """Read and return the voltage from the analog input"""
@@ -24,33 +124,73 @@ class SoilMoistureSensor:
     
     def get_filtered_voltage(self):
         """Apply an exponential moving average (EMA) filter to smooth voltage readings."""
-        voltage = self.read_voltage()
-        if self.ema_voltage is None:
-            self.ema_voltage = voltage  # Initialize on first sample
-        else:
-            self.ema_voltage = (self.alpha * voltage) + ((1 - self.alpha) * self.ema_voltage)
+        return self.filter_voltage(self.read_voltage())
+
+    def filter_voltage(self, voltage):
+        """Feed one voltage sample through the filters and return the smoothed voltage"""
+        if self.pipeline is not None:
+            filtered = self.pipeline.update(voltage)
+            if filtered is not None:
+                self.ema_voltage = filtered
+            elif self.ema_voltage is None:
+                self.ema_voltage = voltage  # decimator still filling its first block
+            return self.ema_voltage
+        if self.spike_filter is not None:
+            voltage = self.spike_filter.update(voltage)
+        self.ema_voltage = ema_update(self.ema_voltage, voltage, self.alpha)  # first sample initializes it
         return self.ema_voltage
 
     def read_moisture_percentage(self):
         """Convert the voltage reading to a percentage moisture level"""
+        stats = self.stats
+        start = stats.start() if stats is not None else 0
         volts = self.read_voltage()
-        voltage = self.get_filtered_voltage()
-        moisture = (voltage - self.min_voltage) / (self.max_voltage - self.min_voltage) * 100
-        moisture = max(0, min(100, moisture))  # Clamp values between 0-100%
+        sample = self.read_voltage()
+        if start:
+            start = stats.stop(smStats.STAGE_ADC, start)
+        voltage = self.filter_voltage(sample)
+        if start:
+            stats.stop(smStats.STAGE_FILTER, start)
+        if self.calibration is not None:
+            # Table lookup on the filtered counts, already clamped to 0-100%
+            moisture = self.calibration.moisture_percentage(int(voltage * 65535 / 3.3 + 0.5))
+        else:
+            moisture = to_moisture(voltage, self.min_voltage, self.max_voltage)  # clamped to 0-100%
+        if self.diagnostics is not None:
+            self.diagnostics.update(sample, moisture)
         return volts ,voltage, moisture
 
+    def read(self, reading=None):
+        """Take a full reading into a smReading.Reading (a new one unless given) and return it"""
+        volts, voltage, moisture = self.read_moisture_percentage()
+        if reading is None:
+            reading = smReading.Reading()
+        return reading.set(time.time(), volts, voltage, moisture, self.read_threshold(), self.voltage_stable(voltage),
+                           health=self.health_flags())
+
+    def health_flags(self):
+        """smReading health flags of the latest sample, 0 without diagnostics"""
+        if self.diagnostics is None:
+            return 0
+        return self.diagnostics.flags
+
     def read_threshold(self):
         """Read and return the state of the threshold input"""
         return self.threshold.value
 
+    def threshold_events_pending(self):
+        """Return the number of threshold transitions waiting to be reported (edge mode only)"""
+        if hasattr(self.threshold, "pending"):
+            return self.threshold.pending()
+        return 0
+
     def voltage_stable(self, voltage):
-        """Check if the last three measurement differences are within +/-0.005V"""
+        """Check if the last three measurement differences are within +/-stable_tolerance (0.005V)"""
         self.voltage_history.append(voltage)
-        if len(self.voltage_history) > 4:
+        if len(self.voltage_history) > STABLE_WINDOW:
             self.voltage_history.pop(0)
         
-        if len(self.voltage_history) < 4:
+        if len(self.voltage_history) < STABLE_WINDOW:
             return False  # Not enough data yet
         
-        diffs = [abs(self.voltage_history[i] - self.voltage_history[i-1]) for i in range(1, 4)]
-        return all(diff <= 0.005 for diff in diffs)
+        return steps_within(self.voltage_history, 0, STABLE_WINDOW, self.stable_tolerance)
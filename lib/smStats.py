@@ -0,0 +1,120 @@
+'''
+Class definition for per-stage latency histograms on the sensor hot path.
+Spans are timed with smTicks (1ms resolution, shorter spans count as 0us) and
+counted into fixed log-scale buckets
+(4 per power of two, about 19% resolution) held in one preallocated array,
+so recording an event allocates nothing. Percentiles are worked out only
+when asked for (e.g. the STATS command)
+'''
+from array import array
+
+import smTicks
+
+# Stage ids, index into STAGES
+STAGE_ADC = 0
+STAGE_FILTER = 1
+STAGE_FORMAT = 2
+STAGE_SENDTO = 3
+STAGE_REQUEST = 4
+STAGES = ("adc", "filter", "format", "sendto", "request")
+
+_SUB_BUCKETS = 4  # buckets per power of two
+
+def bucket_index(us):
+    """Log-scale bucket for a duration in microseconds"""
+    if us < 2 * _SUB_BUCKETS:
+        return us
+    shift = 0
+    while us >= 2 * _SUB_BUCKETS:
+        us >>= 1
+        shift += 1
+    return (shift + 1) * _SUB_BUCKETS + us - _SUB_BUCKETS
+
+def bucket_floor(index):
+    """Smallest duration (us) counted in a bucket"""
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    shift = index // _SUB_BUCKETS - 1
+    return (index % _SUB_BUCKETS + _SUB_BUCKETS) << shift
+
+class LatencyStats:
+    def __init__(self, stages=STAGES, buckets=96, enabled=True):
+        """Preallocate one row of buckets per stage (96 buckets reach ~30s), with enabled False
+        nothing is allocated and spans cost a single attribute test"""
+        self.stages = stages
+        self.buckets = buckets
+        self.enabled = enabled
+        if enabled:
+            self.counts = array("L", [0] * (len(stages) * buckets))
+            self.max_us = array("L", [0] * len(stages))
+        else:
+            self.counts = self.max_us = None
+
+    def start(self):
+        """Begin a span, returns the start time to hand to stop()"""
+        if not self.enabled:
+            return 0
+        return smTicks.ticks_ms()
+
+    def stop(self, stage, start):
+        """End a span begun with start(), returns the end time so spans can be chained"""
+        if not self.enabled or not start:
+            return 0  # also skips the rare span started on tick 0
+        end = smTicks.ticks_ms()
+        self.record(stage, smTicks.ticks_diff(end, start) * 1000)
+        return end
+
+    def record(self, stage, us):
+        """Count one duration (us) for a stage"""
+        index = bucket_index(us)
+        if index >= self.buckets:
+            index = self.buckets - 1
+        self.counts[stage * self.buckets + index] += 1
+        if us > self.max_us[stage]:
+            self.max_us[stage] = us
+
+    def count(self, stage):
+        """Number of spans recorded for a stage"""
+        row = stage * self.buckets
+        total = 0
+        for i in range(row, row + self.buckets):
+            total += self.counts[i]
+        return total
+
+    def percentile(self, stage, p):
+        """Upper bound (us) of the bucket holding the p-th percentile, 0 if nothing recorded"""
+        total = self.count(stage)
+        if not total:
+            return 0
+        rank = (total * p + 99) // 100  # 1-based rank of the p-th percentile
+        row = stage * self.buckets
+        seen = 0
+        for i in range(self.buckets):
+            seen += self.counts[row + i]
+            if seen >= rank and i + 1 < self.buckets:
+                return min(bucket_floor(i + 1) - 1, self.max_us[stage])
+        return self.max_us[stage]  # last bucket is open ended
+
+    def summary(self, stage):
+        """Return (count, p50, p95, p99, max) in microseconds"""
+        return (self.count(stage), self.percentile(stage, 50), self.percentile(stage, 95),
+                self.percentile(stage, 99), self.max_us[stage])
+
+    def report(self):
+        """One line per stage, e.g. 'adc n=120 p50=95us p95=127us p99=143us max=160us'"""
+        if not self.enabled:
+            return "stats off"
+        lines = []
+        for stage, name in enumerate(self.stages):
+            n, p50, p95, p99, top = self.summary(stage)
+            lines.append(f"{name} n={n} p50={p50}us p95={p95}us p99={p99}us max={top}us")
+        return "\n".join(lines)
+
+    def reset(self):
+        """Clear all histograms"""
+        if not self.enabled:
+            return
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        for i in range(len(self.max_us)):
+            self.max_us[i] = 0
@@ -0,0 +1,243 @@
+'''
+Class definition for an append-only reading log on flash, readings are packed,
+batched in RAM and appended to fixed size segment files so the flash sees few,
+larger writes. A checkpoint records how far the backlog has been replayed so
+readings taken during a network outage (or before a reboot) can be forwarded
+in bulk once a collector is reachable again. Each consumer (UDP replay, cloud
+upload) keeps its own named cursor and checkpoint.
+The filesystem must be writable from code (storage.remount("/", readonly=False)
+in boot.py, or an SD card mounted at /sd)
+'''
+import os
+import struct
+import smReading
+
+# Packed reading: epoch seconds, voltage (0.1mV), moisture (0.01%), flags
+RECORD = "<IHHB"
+RECORD_SIZE = struct.calcsize(RECORD)
+FLAG_THRESHOLD = smReading.FLAG_THRESHOLD
+FLAG_STABLE = smReading.FLAG_STABLE
+
+# Checkpoint slot: generation, segment, offset, check
+_CHECKPOINT = "<IIIH"
+# Cursor used by replay() unless told otherwise, its checkpoint files are ckpt0/ckpt1
+DEFAULT_CURSOR = "ckpt"
+
+def pack_reading(buf, offset, timestamp, voltage, moisture, threshold, stable, health=0):
+    """Pack one reading into buf at offset, health is the smReading health flag bits"""
+    flags = (FLAG_THRESHOLD if threshold else 0) | (FLAG_STABLE if stable else 0) | health
+    struct.pack_into(RECORD, buf, offset, int(timestamp), int(voltage * 10000 + 0.5),
+                     int(moisture * 100 + 0.5), flags)
+
+def unpack_reading(buf, offset=0):
+    """Return (timestamp, voltage, moisture, threshold, stable) from a packed reading"""
+    timestamp, voltage, moisture, flags = struct.unpack_from(RECORD, buf, offset)
+    return timestamp, voltage / 10000, moisture / 100, bool(flags & FLAG_THRESHOLD), bool(flags & FLAG_STABLE)
+
+def load_reading(buf, offset, reading):
+    """Fill a smReading.Reading from a packed log record (no volts or sequence number are logged)"""
+    timestamp, voltage, moisture, flags = struct.unpack_from(RECORD, buf, offset)
+    reading.seq = 0
+    reading.timestamp = timestamp
+    reading.volts = reading.voltage = voltage / 10000
+    reading.moisture = moisture / 100
+    reading.flags = flags
+    return reading
+
+class ReadingLog:
+    def __init__(self, path="/log", segment_size=65536, max_segments=8, batch=32):
+        """Open (or create) the log directory, batch readings are buffered before each flash write"""
+        self.path = path
+        self.segment_size = segment_size - segment_size % RECORD_SIZE
+        self.max_segments = max_segments
+        self.pending = bytearray(batch * RECORD_SIZE)
+        self.pending_count = 0
+        self.batch = batch
+        self.write_errors = 0
+        self.dropped = 0
+        try:
+            os.mkdir(path)
+        except OSError:
+            pass  # already exists, or a read-only filesystem (checked below)
+        try:
+            segments = self._segments()
+            self.enabled = True
+        except OSError as e:
+            # CIRCUITPY is read-only to code without a boot.py remount, run without the log
+            segments = []
+            self.enabled = False
+            print(f"Reading log disabled, {path} unavailable: {e}")
+        self.tail = segments[0] if segments else 0
+        self.head = segments[-1] if segments else 0
+        self.head_size = self._size(self.head)
+        # Replay cursors by name: [segment, offset, generation, dropped], each with its own checkpoint files
+        self.cursors = {}
+        self.add_cursor(DEFAULT_CURSOR)
+
+    def _name(self, segment):
+        return f"{self.path}/seg{segment:05d}.bin"
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.path):
+            if name.startswith("seg") and name.endswith(".bin"):
+                segments.append(int(name[3:-4]))
+        segments.sort()
+        return segments
+
+    def _size(self, segment):
+        try:
+            return os.stat(self._name(segment))[6]
+        except OSError:
+            return 0
+
+    def add_cursor(self, name):
+        """Track another consumer of the log (e.g. a cloud uploader) with its own checkpoint"""
+        if name in self.cursors:
+            return
+        segment, offset, generation = self._load_checkpoint(name)
+        if segment < self.tail:
+            segment, offset = self.tail, 0
+        self.cursors[name] = [segment, offset, generation, 0]
+
+    def _load_checkpoint(self, name):
+        """Read both checkpoint slots and return the newest valid (segment, offset, generation)"""
+        best = None
+        for slot in (0, 1):
+            try:
+                with open(f"{self.path}/{name}{slot}", "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            if len(data) != struct.calcsize(_CHECKPOINT):
+                continue
+            generation, segment, offset, check = struct.unpack(_CHECKPOINT, data)
+            if check != (generation ^ segment ^ offset) & 0xFFFF:
+                continue  # torn write
+            if best is None or generation > best[0]:
+                best = (generation, segment, offset)
+        if best is None:
+            return self.tail, 0, 0
+        return best[1], best[2], best[0]
+
+    def _save_checkpoint(self, name):
+        """Write a replay cursor, alternating slots so a torn write keeps the previous one"""
+        cursor = self.cursors[name]
+        cursor[2] += 1
+        generation, segment, offset = cursor[2], cursor[0], cursor[1]
+        data = struct.pack(_CHECKPOINT, generation, segment, offset, (generation ^ segment ^ offset) & 0xFFFF)
+        try:
+            with open(f"{self.path}/{name}{generation & 1}", "wb") as f:
+                f.write(data)
+        except OSError as e:
+            self.write_errors += 1
+            print(f"Failed to write log checkpoint: {e}")
+
+    def append(self, timestamp, voltage, moisture, threshold, stable, health=0):
+        """Buffer one reading, flushing to flash once a batch is full"""
+        pack_reading(self.pending, self.pending_count * RECORD_SIZE, timestamp, voltage, moisture, threshold, stable, health)
+        self.pending_count += 1
+        if self.pending_count == self.batch:
+            self.flush()
+
+    def append_reading(self, reading):
+        """Buffer one smReading.Reading"""
+        self.append(reading.timestamp, reading.voltage, reading.moisture, reading.threshold, reading.stable,
+                    reading.health)
+
+    def flush(self):
+        """Append the buffered readings to the head segment"""
+        if not self.pending_count:
+            return True
+        if not self.enabled:
+            self.write_errors += 1
+            self.dropped += self.pending_count
+            self.pending_count = 0
+            return False
+        length = self.pending_count * RECORD_SIZE
+        try:
+            with open(self._name(self.head), "ab") as f:
+                f.write(memoryview(self.pending)[:length])
+        except OSError as e:
+            self.write_errors += 1
+            self.dropped += self.pending_count
+            self.pending_count = 0
+            print(f"Failed to write reading log: {e}")
+            return False
+        self.pending_count = 0
+        self.head_size += length
+        if self.head_size >= self.segment_size:
+            self._rotate()
+        return True
+
+    def _rotate(self):
+        """Start a new head segment, dropping the oldest once max_segments is reached"""
+        self.head += 1
+        self.head_size = 0
+        while self.head - self.tail >= self.max_segments:
+            for name, cursor in self.cursors.items():
+                if cursor[0] == self.tail:
+                    # Readings this consumer has not replayed yet are lost, count them
+                    lost = (self._size(self.tail) - cursor[1]) // RECORD_SIZE
+                    cursor[3] += lost
+                    if name == DEFAULT_CURSOR:
+                        self.dropped += lost
+                    cursor[0], cursor[1] = self.tail + 1, 0
+            try:
+                os.remove(self._name(self.tail))
+            except OSError:
+                pass
+            self.tail += 1
+
+    def backlog(self, cursor=DEFAULT_CURSOR):
+        """Number of readings the cursor has not replayed yet (including the RAM batch)"""
+        segment, offset = self.cursors[cursor][0], self.cursors[cursor][1]
+        total = self.pending_count
+        for index in range(segment, self.head + 1):
+            size = self.head_size if index == self.head else self._size(index)
+            total += size // RECORD_SIZE
+        return total - offset // RECORD_SIZE
+
+    def peek(self, view, cursor=DEFAULT_CURSOR):
+        """Copy the next packed readings at the cursor into view (a whole number of records long)
+        without moving it, return the byte count, 0 once the cursor has caught up"""
+        self.flush()
+        position = self.cursors[cursor]
+        while position[0] <= self.head:
+            size = self.head_size if position[0] == self.head else self._size(position[0])
+            if position[1] >= size:
+                if position[0] == self.head:
+                    break
+                position[0] += 1  # segment done, saved with the next advance()
+                position[1] = 0
+                continue
+            with open(self._name(position[0]), "rb") as f:
+                f.seek(position[1])
+                return f.readinto(memoryview(view)[:min(size - position[1], len(view))]) or 0
+        return 0
+
+    def advance(self, nbytes, cursor=DEFAULT_CURSOR, save=True):
+        """Move the cursor past nbytes returned by peek() once they have been delivered"""
+        self.cursors[cursor][1] += nbytes
+        if save:
+            self._save_checkpoint(cursor)
+
+    def replay(self, send, prefix=b"", chunk_records=32, cursor=DEFAULT_CURSOR):
+        """Send the backlog in chunks of packed readings (each preceded by prefix), send() returns
+        False to stop; the checkpoint is advanced past every chunk that was sent, return readings sent"""
+        start = len(prefix)
+        chunk = bytearray(start + chunk_records * RECORD_SIZE)
+        chunk[:start] = prefix
+        view = memoryview(chunk)
+        sent = 0
+        while True:
+            length = self.peek(view[start:], cursor)
+            if not length:
+                break
+            if send(view[:start + length]) is False:
+                break
+            self.advance(length, cursor, save=False)
+            sent += length // RECORD_SIZE
+        if sent:
+            self._save_checkpoint(cursor)  # once per replay, not per chunk
+        return sent
@@ -0,0 +1,84 @@
+'''
+Class definition for an edge driven threshold input, the pin is scanned and
+debounced in the background by keypad so transitions between readings are
+not lost, each transition is kept with its timestamp in a bounded queue
+'''
+import keypad
+from array import array
+
+import smFormat
+
+class ThresholdMonitor:
+    def __init__(self, threshold_pin, debounce=0.02, max_events=16):
+        """Track a pulled-up threshold input, debounce is the scan interval in seconds"""
+        # Pulled up input, the threshold is "pressed" when the pin reads low
+        self.keys = keypad.Keys((threshold_pin,), value_when_pressed=False, pull=True,
+                                interval=debounce, max_events=max_events)
+        self._event = keypad.Event()
+        self.state = True
+        # Ring of recorded transitions, timestamps are supervisor.ticks_ms()
+        self.size = max_events
+        self.timestamps = array('L', [0] * max_events)
+        self.values = array('b', [0] * max_events)
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+
+    def poll(self):
+        """Move pending keypad events into the ring, return the number of transitions seen"""
+        seen = 0
+        event = self._event
+        while self.keys.events.get_into(event):
+            self.state = event.released  # released means the pin went back high
+            slot = (self.head + self.count) % self.size
+            if self.count == self.size:
+                self.head = (self.head + 1) % self.size  # drop the oldest
+                self.dropped += 1
+            else:
+                self.count += 1
+            self.timestamps[slot] = event.timestamp
+            self.values[slot] = self.state
+            seen += 1
+        if self.keys.events.overflowed:
+            self.dropped += 1
+            self.keys.events.clear()  # overflowed is read-only, clearing the drained queue resets it
+        return seen
+
+    @property
+    def value(self):
+        """Debounced threshold state, same meaning as DigitalInOut.value"""
+        self.poll()
+        return self.state
+
+    def pending(self):
+        """Return the number of transitions waiting to be reported"""
+        self.poll()
+        return self.count
+
+    def drain(self):
+        """Return and clear the recorded transitions as (timestamp_ms, value) tuples"""
+        self.poll()
+        events = []
+        while self.count:
+            events.append((self.timestamps[self.head], bool(self.values[self.head])))
+            self.head = (self.head + 1) % self.size
+            self.count -= 1
+        return events
+
+    def render(self, buf, pos=0):
+        """Write and clear the recorded transitions as 'Threshold events: ms:T ms:F', return the new end"""
+        self.poll()
+        pos = smFormat.write_bytes(buf, pos, b"Threshold events:")
+        while self.count:
+            buf[pos] = 32  # ' '
+            pos = smFormat.write_uint(buf, pos + 1, self.timestamps[self.head])
+            buf[pos] = 58  # ':'
+            buf[pos + 1] = 84 if self.values[self.head] else 70  # 'T' / 'F'
+            pos += 2
+            self.head = (self.head + 1) % self.size
+            self.count -= 1
+        if self.dropped:
+            pos = smFormat.write_bytes(buf, pos, b" dropped:")
+            pos = smFormat.write_uint(buf, pos, self.dropped)
+            self.dropped = 0
+        return pos
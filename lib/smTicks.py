@@ -0,0 +1,27 @@
+'''
+Wrapping millisecond ticks for the hot path timers. supervisor.ticks_ms() stays
+in the small-int range (it wraps every 2**29 ms, about 6.2 days), where
+time.monotonic_ns() hands back a long that is allocated on every call, so
+differences and deadlines must go through ticks_diff() and ticks_add()
+'''
+_TICKS_PERIOD = 1 << 29
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+try:
+    from supervisor import ticks_ms
+except ImportError:
+    import time
+
+    def ticks_ms():
+        """Host stand-in with the same wrap as supervisor.ticks_ms()"""
+        return (time.monotonic_ns() // 1000000) & _TICKS_MAX
+
+def ticks_add(ticks, delta):
+    """Ticks value delta ms after ticks, delta may be negative"""
+    return (ticks + delta) & _TICKS_MAX
+
+def ticks_diff(end, start):
+    """Signed ms from start to end, correct across a wrap for spans under about 3.1 days"""
+    diff = (end - start) & _TICKS_MAX
+    return diff - _TICKS_PERIOD if diff >= _TICKS_HALFPERIOD else diff
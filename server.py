@@ -8,6 +8,7 @@ import adafruit_requests
 import adafruit_ntp
 import board
 import digitalio
+import cPyAnnounce
 
 # Load settings from settings.toml and check for no credentials
 WIFI_SSID = os.getenv("WIFI_SSID")
@@ -15,7 +16,7 @@ WIFI_PASSWORD = os.getenv("WIFI_PASS")
 HOSTNAME = os.getenv("HOSTNAME")
 HTTPPORT = 5244
 MAX_RETRIES = 10
-BROADCAST_IP = "10.0.0.255"
+BROADCAST_IP = os.getenv("ANNOUNCE_GROUP") or "10.0.0.255"
 if not WIFI_SSID or not WIFI_PASSWORD:
     raise ValueError("Missing required settings in settings.toml")
 
@@ -125,34 +126,28 @@ if not mySock:
     exit()
 else:
     print(f"sock setup complete: {mySock}, {myServer}")
+# recvfrom_into() gives up after a second, so the announcement schedule keeps running without traffic
+mySock.settimeout(1)
 init_ntp()
 announcement = b"ITAOT"
+announcer = cPyAnnounce.Announcer(mySock, announcement, BROADCAST_IP, HTTPPORT)
 
-print(f"Broadcasting {announcement.decode()} to {BROADCAST_IP}:{HTTPPORT} every 5 seconds")
+print(f"Announcing {announcement.decode()} to {BROADCAST_IP}:{HTTPPORT}, backing off once acknowledged")
 buffer = bytearray(1024)  # Create a buffer for incoming data
 while True:
-    try:
-        mySock.sendto(announcement, (BROADCAST_IP, HTTPPORT))
+    announcer.check_link(wifi.radio.ipv4_address, time.monotonic())
+    if announcer.poll(time.monotonic()):
         print(f"{announcement.decode()} broadcasted")
-        pass  # Exit loop if successful
-    except OSError as e:
-        if e.errno == 11:  # EAGAIN
-            print("Send buffer full, retrying...")
-            time.sleep(0.1)  # Small delay before retrying
-        else:
-            raise  # Raise other unexpected errors
-        
+
     try:
         print(f"checking for response:")
-        bytes_received = mySock.recv_into(buffer)
-        if bytes_received:
-            received_msg = buffer[:bytes_received].decode()
-            print(f"Received response: {received_msg}")
+        bytes_received, addr = mySock.recvfrom_into(buffer)
         print(f"Received response from {addr}:")
-        response_msg = data.decode()
+        response_msg = buffer[:bytes_received].decode()
         print(f"{response_msg} received")
         if "ACK" in response_msg:
-            sock.sendto(f"{get_timestamp()} WAY?".encode(), addr)
+            announcer.acknowledge()
+            mySock.sendto(f"{get_timestamp()} WAY?".encode(), addr)
         elif "WAY" in response_msg:
             mySock.sendto(f"{get_timestamp()} IAM: {HOSTNAME} {device_version}, {device_capabilities}".encode(), addr)
         continue
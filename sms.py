@@ -1,34 +1,39 @@
 import time
 import board
 import smSensor
+import smSchedule
+import smReading
+import cPyPower
 
 # Initialize the soil moisture sensor on the appropriate analog pin
 moisture_pin = board.A0
 threshold_pin = board.GP1
 
 sensor = smSensor.SoilMoistureSensor(moisture_pin, threshold_pin)
+# Sample every second during transients, back off to once a minute when stable
+sampler = smSchedule.AdaptiveInterval(min_interval=1.0, max_interval=60.0)
 
 def get_timestamp():
     now = time.localtime()
     return f"{now.tm_mon:02d}/{now.tm_mday:02d}/{now.tm_year} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}"
 
 def main():
-    read_data = 10.0
-    interval = 0.1
-    count = 10.0 
+    # Deadlines come from the schedule so print/read time does not accumulate as drift
+    # Light sleep between readings on the board (time.sleep() under a simulated backend elsewhere)
+    periodic = smSchedule.PeriodicSampler(sampler.interval, sleeper=cPyPower.make_sleeper())
+    stats_every = 60  # readings between jitter reports
+    reading = smReading.Reading()  # filled in place every cycle
     while True:
-        if count >= read_data:
-            timestamp = get_timestamp()
-            volts, voltage, moisture = sensor.read_moisture_percentage()
-            threshold_state = sensor.read_threshold()
-            stable = sensor.voltage_stable(voltage)
-            stability_marker = '*' if stable else '+'
-            print(f"[{timestamp}] Reading: {volts:.3f}V, Voltage: {voltage:.3f}V, Moisture: {moisture:.1f}%, Threshold: {threshold_state} {stability_marker}")
-            count = 0.0
-            time.sleep(interval)
-        else:
-            count += 0.1
-            time.sleep(interval)
+        periodic.wait()
+        timestamp = get_timestamp()
+        sensor.read(reading)
+        stability_marker = '*' if reading.stable else '+'
+        print(f"[{timestamp}] Reading: {reading.volts:.3f}V, Voltage: {reading.voltage:.3f}V, Moisture: {reading.moisture:.1f}%, Threshold: {reading.threshold} {stability_marker}")
+        periodic.set_period(sampler.update(reading.voltage, reading.stable, time.monotonic()))
+        samples, mean_jitter, max_jitter, overruns = periodic.jitter_stats()
+        if samples % stats_every == 0:
+            print(f"Sampler: {samples} samples, jitter mean {mean_jitter}ms max {max_jitter}ms, {overruns} overruns, "
+                  f"active {periodic.duty_cycle() * 100:.2f}%")
 
 ################################################################################
 ### run the main() routine (see above)    
@@ -0,0 +1,64 @@
+'''
+Per-channel cost of SoilMoistureArray.scan() against one SoilMoistureSensor per
+probe, for a growing number of probes per node
+runs on the board or on the host, the inputs are simulated so only the
+scan, filter and stability work is timed
+'''
+import sys
+import time
+
+sys.path.insert(0, "lib")
+sys.path.insert(0, "../lib")
+import smArray
+import smSensor
+
+ROUNDS = 200
+CHANNELS = (1, 2, 3, 4, 8)
+BURST = 1  # one sample per channel per scan, as many ADC reads as a SoilMoistureSensor takes per reading
+
+
+class FakeInput:
+    """Slowly drifting raw count standing in for AnalogIn"""
+
+    def __init__(self, start):
+        self.count = start
+
+    @property
+    def value(self):
+        self.count = (self.count + 7) & 0xFFFF
+        return self.count
+
+
+class FakeThreshold:
+    value = True
+
+
+def per_channel_us(func, channels):
+    start = time.monotonic_ns()
+    for _ in range(ROUNDS):
+        func()
+    return (time.monotonic_ns() - start) / (ROUNDS * channels * 1000)
+
+
+def main():
+    print("channels, sensors us/channel, array us/channel")
+    for channels in CHANNELS:
+        pins = [FakeInput(30000 + ch * 1000) for ch in range(channels)]
+        thresholds = [FakeThreshold() for ch in range(channels)]
+        sensors = [smSensor.SoilMoistureSensor(pins[ch], thresholds[ch], diagnostics=None)
+                   for ch in range(channels)]
+        array = smArray.SoilMoistureArray(pins, thresholds, burst=BURST)
+
+        def read_sensors():
+            for sensor in sensors:
+                volts, voltage, moisture = sensor.read_moisture_percentage()
+                sensor.read_threshold()
+                sensor.voltage_stable(voltage)
+
+        single = per_channel_us(read_sensors, channels)
+        batched = per_channel_us(array.scan, channels)
+        print(f"{channels}, {single:.1f}, {batched:.1f}")
+
+
+if __name__ == "__main__":
+    main()
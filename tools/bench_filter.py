@@ -0,0 +1,51 @@
+'''
+CPU cost per sample of the spike rejection stages in smFilter compared with
+the plain EMA used by SoilMoistureSensor, on a synthetic trace with ADC spikes
+runs on the board or on the host
+'''
+import random
+import sys
+import time
+
+sys.path.insert(0, "lib")
+sys.path.insert(0, "../lib")
+import smFilter
+
+SAMPLES = 2000
+ALPHA = 0.3
+
+
+def make_trace():
+    trace = []
+    for i in range(SAMPLES):
+        v = 2.4 + random.uniform(-0.002, 0.002)
+        if i % 97 == 50:
+            v += 0.8  # single sample spike
+        trace.append(v)
+    return trace
+
+
+def run(label, trace, spike_filter):
+    ema = None
+    worst = 0.0
+    start = time.monotonic_ns()
+    for v in trace:
+        if spike_filter is not None:
+            v = spike_filter.update(v)
+        ema = v if ema is None else (ALPHA * v) + ((1 - ALPHA) * ema)
+        if abs(ema - 2.4) > worst:
+            worst = abs(ema - 2.4)
+    elapsed = time.monotonic_ns() - start
+    print(f"{label}: {elapsed // len(trace)} ns/sample, worst EMA error {worst:.3f}V")
+
+
+def main():
+    random.seed(1)
+    trace = make_trace()
+    run("EMA only", trace, None)
+    run("median(5) + EMA", trace, smFilter.MedianFilter(5))
+    run("hampel(5) + EMA", trace, smFilter.HampelFilter(5))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+'''
+Allocation benchmark for the reading formatter, compares the f-string + encode()
+path used by codetwf.py with smFormat.ReadingFormatter.render()
+runs on the board (gc.mem_alloc) or on the host (tracemalloc)
+'''
+import gc
+import random
+import sys
+import time
+
+sys.path.insert(0, "lib")
+sys.path.insert(0, "../lib")
+import smFormat
+
+ROUNDS = 1000
+
+try:
+    gc.mem_alloc
+    SWEEP = 2000  # readings compared with the f-string path, kept short on the board
+
+    def heap_used():
+        return gc.mem_alloc()
+
+    def start_tracking():
+        pass
+except AttributeError:
+    import tracemalloc
+    SWEEP = 200000
+
+    def heap_used():
+        return tracemalloc.get_traced_memory()[0]
+
+    def start_tracking():
+        tracemalloc.start()
+
+
+def fstring_reading(now, voltage, moisture, threshold_state, stable):
+    stability_marker = '*' if stable else '+'
+    timestamp = f"{now.tm_mon:02d}/{now.tm_mday:02d}/{now.tm_year} {now.tm_hour:02d}:{now.tm_min:02d}:{now.tm_sec:02d}"
+    formatted_output = f"[{timestamp}] Voltage: {voltage:.3f}V, Moisture: {moisture:.1f}%, Threshold: {threshold_state} {stability_marker}"
+    return formatted_output.encode()
+
+
+def measure(label, func):
+    gc.collect()
+    gc.disable()
+    before = heap_used()
+    start = time.monotonic_ns()
+    peak = 0
+    for i in range(ROUNDS):
+        func(i)
+        used = heap_used() - before
+        if used > peak:
+            peak = used
+    elapsed = time.monotonic_ns() - start
+    growth = heap_used() - before
+    gc.enable()
+    print(f"{label}: {elapsed // ROUNDS} ns/reading, heap growth {growth / ROUNDS:.1f} B/reading, peak {peak} B")
+
+
+def main():
+    start_tracking()
+    now = time.localtime()
+    formatter = smFormat.ReadingFormatter(smFormat.UDP_TEMPLATE)
+    # results are kept alive so the host's refcounting cannot hide allocations
+    sent = [None] * ROUNDS
+
+    def old(i):
+        sent[i] = fstring_reading(now, 1.234 + i * 0.0001, 42.5, True, i & 1)
+
+    def new(i):
+        sent[i] = formatter.render(now, 1.5, 1.234 + i * 0.0001, 42.5, True, i & 1)
+
+    measure("f-string", old)
+    sent = [None] * ROUNDS
+    measure("ReadingFormatter", new)
+    print("byte-identical:", sweep(now, formatter))
+
+
+def sweep(now, formatter):
+    """Compare with the f-string path over random values, plus exact binary ties like 2.0625"""
+    mismatches = 0
+    for i in range(SWEEP):
+        if i & 1:
+            # Values on (or next to) a decimal tie, where half-up and f-string rounding differ
+            voltage = random.randint(0, 33000) / 10000 + random.choice((0.0005, 0.0625, 0.0))
+            moisture = random.randint(0, 2000) / 20
+        else:
+            voltage = random.uniform(-0.5, 3.5)
+            moisture = random.uniform(0, 100)
+        stable = i & 2
+        expected = fstring_reading(now, voltage, moisture, True, stable)
+        actual = bytes(formatter.payload(formatter.render(now, 1.5, voltage, moisture, True, stable)))
+        if expected != actual:
+            mismatches += 1
+            if mismatches <= 5:
+                print("mismatch:", expected, actual)
+    print(f"sweep: {mismatches} mismatches in {SWEEP} readings")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+'''
+Host side replay of recorded raw ADC traces through the SoilMoistureSensor
+filter and stability logic, sweeping a grid of settings across a process pool
+
+usage: python tools/replay.py TRACE [--alpha 0.1,0.2,0.3] [--tolerance 0.002,0.005]
+                              [--spike none,median,hampel] [--workers N]
+
+TRACE is a CSV (one raw count per line, or "timestamp,raw" rows) or a .bin
+file of little-endian uint16 counts. Results are printed as CSV sorted by RMSE
+'''
+import argparse
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+import smSensor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # metrics fall back to pure Python
+
+# Half width of the centred moving average used as the reference signal
+REFERENCE_HALF_WIDTH = 15
+MAX_LAG = 60
+
+
+class TraceInput:
+    """Recorded raw counts standing in for AnalogIn, value is the current sample"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.index = 0
+
+    @property
+    def value(self):
+        return self.raw[self.index]
+
+
+class FixedInput:
+    """Threshold input that never changes"""
+    value = True
+
+
+def load_trace(path):
+    """Load raw counts from a CSV or .bin trace"""
+    if path.endswith(".bin"):
+        raw = array('H')
+        with open(path, "rb") as f:
+            raw.frombytes(f.read())
+        if sys.byteorder != "little":
+            raw.byteswap()
+        return raw
+    raw = array('H')
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            field = line.split(",")[-1]
+            try:
+                raw.append(int(float(field)))
+            except ValueError:
+                continue  # header row
+    return raw
+
+
+def reference_voltage(raw, half_width=REFERENCE_HALF_WIDTH):
+    """Zero-phase centred moving average of the raw voltage, the 'truth' for error metrics"""
+    n = len(raw)
+    prefix = [0] * (n + 1)
+    for i in range(n):
+        prefix[i + 1] = prefix[i] + raw[i]
+    ref = array('d', [0.0] * n)
+    for i in range(n):
+        lo = max(0, i - half_width)
+        hi = min(n, i + half_width + 1)
+        ref[i] = (prefix[hi] - prefix[lo]) / (hi - lo) * 3.3 / 65535
+    return ref
+
+
+def replay(raw, alpha, tolerance, spike):
+    """Run the trace through a SoilMoistureSensor, return filtered voltages and stability flags"""
+    trace = TraceInput(raw)
+    sensor = smSensor.SoilMoistureSensor(trace, FixedInput(), spike_filter=spike)
+    sensor.alpha = alpha
+    sensor.stable_tolerance = tolerance
+    filtered = array('d', [0.0] * len(raw))
+    stable = bytearray(len(raw))
+    for i in range(len(raw)):
+        trace.index = i
+        volts, voltage, moisture = sensor.read_moisture_percentage()
+        filtered[i] = voltage
+        stable[i] = sensor.voltage_stable(voltage)
+    return filtered, stable
+
+
+def best_lag(filtered, ref, sq):
+    """The delay (samples) that best lines the filtered signal up with the reference"""
+    n = len(ref)
+    if np is not None:
+        f = np.frombuffer(filtered, dtype=np.float64)
+        r = np.frombuffer(ref, dtype=np.float64)
+    lag_found = 0
+    best_sq = sq
+    for lag in range(1, min(MAX_LAG, n - 1) + 1):
+        if np is not None:
+            diff = f[lag:] - r[:n - lag]
+            total = float(diff @ diff)
+        else:
+            total = 0.0
+            for i in range(lag, n):
+                err = filtered[i] - ref[i - lag]
+                total += err * err
+        total *= n / (n - lag)
+        if total < best_sq:
+            best_sq = total
+            lag_found = lag
+    return lag_found
+
+
+def score(filtered, stable, ref):
+    """Error and latency metrics of one replay against the reference"""
+    n = len(ref)
+    sq = 0.0
+    worst = 0.0
+    for i in range(n):
+        err = filtered[i] - ref[i]
+        sq += err * err
+        if abs(err) > worst:
+            worst = abs(err)
+    # Settling: samples from the start of each unstable run until stable again
+    runs = 0
+    unstable = 0
+    for i in range(n):
+        if not stable[i]:
+            unstable += 1
+            if i == 0 or stable[i - 1]:
+                runs += 1
+    return {
+        "rmse": (sq / n) ** 0.5 if n else 0.0,
+        "max_error": worst,
+        "lag": best_lag(filtered, ref, sq),
+        "stable_fraction": 1 - unstable / n if n else 0.0,
+        "mean_settle": unstable / runs if runs else 0.0,
+    }
+
+
+_trace = None
+_reference = None
+
+
+def _init_worker(raw, ref):
+    global _trace, _reference
+    _trace = raw
+    _reference = ref
+
+
+def _run_config(config):
+    alpha, tolerance, spike = config
+    start = time.perf_counter()
+    filtered, stable = replay(_trace, alpha, tolerance, None if spike == "none" else spike)
+    elapsed = time.perf_counter() - start
+    metrics = score(filtered, stable, _reference)
+    metrics["alpha"] = alpha
+    metrics["tolerance"] = tolerance
+    metrics["spike"] = spike
+    metrics["us_per_sample"] = elapsed * 1e6 / max(1, len(_trace))
+    return metrics
+
+
+def floats(text):
+    return [float(v) for v in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace")
+    parser.add_argument("--alpha", type=floats, default=[0.05, 0.1, 0.2, 0.3, 0.5])
+    parser.add_argument("--tolerance", type=floats, default=[0.002, 0.005, 0.01])
+    parser.add_argument("--spike", default="none,median,hampel")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    raw = load_trace(args.trace)
+    if not raw:
+        sys.exit(f"No samples in {args.trace}")
+    ref = reference_voltage(raw)
+    grid = list(itertools.product(args.alpha, args.tolerance, args.spike.split(",")))
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(raw, ref)) as pool:
+        results = pool.map(_run_config, grid)
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["rmse"])
+    columns = ("alpha", "tolerance", "spike", "rmse", "max_error", "lag", "stable_fraction", "mean_settle", "us_per_sample")
+    print(",".join(columns))
+    for r in results:
+        print(",".join(f"{r[c]:.6g}" if isinstance(r[c], float) else str(r[c]) for c in columns))
+    print(f"# {len(grid)} configurations x {len(raw)} samples in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+'''
+Local stand-in for the cloud batch endpoint used by lib/cPyUpload.py, so the
+uploader can be exercised on a host without a Blynk account
+
+usage: python tools/upload_standin.py [--port 8080] [--token TOKEN] [--fail-every N]
+       python tools/upload_standin.py --self-test [--readings 1000] [--fail-every N]
+
+The server accepts POST /external/api/batch/update?token=...&pin=V0 with a
+JSON [[epoch_ms, value], ...] body, keeps HTTP/1.1 connections alive and
+prints one line per batch. --fail-every N answers every Nth request with a
+503. --self-test starts the server on a free port, logs synthetic readings to
+a temporary smStore.ReadingLog and drains it with BatchUploader over one
+persistent http.client connection, then checks every reading arrived
+'''
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+import cPyUpload
+import smStore
+
+PATH = "/external/api/batch/update"
+
+
+class StandinServer(ThreadingHTTPServer):
+    """Batch endpoint state: accepted points per pin, request and connection counters"""
+
+    daemon_threads = True
+
+    def __init__(self, address, token=None, fail_every=0, quiet=False):
+        super().__init__(address, StandinHandler)
+        self.token = token
+        self.fail_every = fail_every
+        self.quiet = quiet
+        self.points = {}  # pin -> {epoch_ms: value}
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoint
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass  # one line per batch is printed instead
+
+    def _reply(self, status, text=""):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        with server.lock:
+            server.requests += 1
+            count = server.requests
+        if url.path != PATH:
+            return self._reply(404, "not found")
+        if server.token is not None and query.get("token", [""])[0] != server.token:
+            return self._reply(400, "Invalid token.")
+        if server.fail_every and count % server.fail_every == 0:
+            return self._reply(503, "injected failure")
+        pin = query.get("pin", [""])[0]
+        try:
+            points = json.loads(body)
+            batch = {int(ts): float(value) for ts, value in points}
+        except (ValueError, TypeError) as e:
+            return self._reply(400, f"bad body: {e}")
+        with server.lock:
+            server.points.setdefault(pin, {}).update(batch)
+        if not server.quiet:
+            print(f"{pin}: {len(batch)} points, {len(body)} bytes, request {count}")
+        self._reply(200)
+
+
+class KeepAliveSession:
+    """The post() subset of adafruit_requests.Session on one persistent http.client connection"""
+
+    def __init__(self):
+        self.connection = None
+        self.opened = 0
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        parts = urlsplit(url)
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+            self.opened += 1
+        try:
+            self.connection.request("POST", f"{parts.path}?{parts.query}", body=data, headers=headers or {})
+            return KeepAliveResponse(self.connection.getresponse())
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise OSError("connection lost")
+
+
+class KeepAliveResponse:
+    def __init__(self, response):
+        self.status_code = response.status
+        self._response = response
+
+    def close(self):
+        self._response.read()  # drain so the connection can carry the next request
+
+
+def self_test(readings, fail_every):
+    server = StandinServer(("127.0.0.1", 0), token="standin", fail_every=fail_every, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}{PATH}"
+    with tempfile.TemporaryDirectory() as path:
+        log = smStore.ReadingLog(path, segment_size=4096, max_segments=64)
+        start = 1700000000
+        for i in range(readings):
+            log.append(start + i * 10, 2.5 - i * 0.0001, 40 + (i % 100) / 10, False, True)
+        session = KeepAliveSession()
+        uploader = cPyUpload.BatchUploader(session, log, "standin", url=url, batch=256, interval=3600,
+                                           min_backoff=0.01, max_backoff=0.05)
+        steps = uploader.steps()
+        began = time.monotonic()
+        while uploader.backlog() and time.monotonic() - began < 30:
+            time.sleep(min(next(steps), 0.05))
+        print(uploader.report())
+        print(f"server: {server.requests} requests over {server.connections} connections, "
+              f"client opened {session.opened}")
+        received = server.points.get("V0", {})
+        missing = [i for i in range(readings) if (start + i * 10) * 1000 not in received]
+        replay_backlog = log.backlog()
+    server.shutdown()
+    ok = not missing and len(server.points.get("V1", {})) == readings and replay_backlog == readings
+    print("self-test", "passed" if ok else f"FAILED, {len(missing)} readings missing")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--token", default=None, help="reject requests with another token")
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with 503")
+    parser.add_argument("--self-test", action="store_true")
+    parser.add_argument("--readings", type=int, default=1000, help="readings logged for --self-test")
+    args = parser.parse_args()
+    if args.self_test:
+        return self_test(args.readings, args.fail_every)
+    server = StandinServer(("0.0.0.0", args.port), token=args.token, fail_every=args.fail_every)
+    print(f"stand-in listening on http://0.0.0.0:{args.port}{PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())